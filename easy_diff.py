@@ -6,16 +6,150 @@ License: MIT
 """
 import sublime
 import time
-import difflib
 from os.path import basename, join, splitext, exists
 from os import stat as osstat
 import tempfile
-from EasyDiff.easy_diff_global import load_settings, get_encoding, notify
+import hashlib
+import io
+from itertools import chain
+from array import array
+from EasyDiff.easy_diff_global import load_settings, get_encoding, normalize_encoding, notify
+from EasyDiff.easy_diff_global import get_cached_diff, set_cached_diff
+from EasyDiff.easy_diff_jobs import start_job
+from EasyDiff.easy_diff_highlight import highlight
+import EasyDiff.lib.engine as engine
+import EasyDiff.lib.fastcmp as fastcmp
 import subprocess
 
 LEFT = 1
 RIGHT = 2
 
+# Characters appended to the result view per UI tick.
+CHUNK_SIZE = 65536
+
+# Approximate memory used by one cached opcode.
+OPCODE_SIZE = 128
+
+RENDERERS = {}
+
+LIVE = {}
+
+
+def iter_lines(text):
+    """Iterate the lines of the text without building a list of them."""
+
+    start = 0
+    while True:
+        end = text.find('\n', start)
+        if end == -1:
+            yield text[start:]
+            break
+        yield text[start:end]
+        start = end + 1
+
+
+def split_lines(text):
+    """
+    Split the text into lines the way Sublime does.
+
+    Only line endings (CRLF, CR, and LF) start a new line, unlike `str.splitlines`,
+    which also splits on form feeds and other Unicode line breaks.
+    """
+
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    return lines
+
+
+class EasyDiffRenderer(object):
+    """Render diff lines into the result view in chunks across several UI ticks."""
+
+    def __init__(self, win, title, lines):
+        """Initialize."""
+
+        self.win = win
+        self.title = title
+        self.lines = iter(lines)
+        self.view = None
+        self.started = False
+        # Change count of the view when the last queued line was appended.
+        self.finished = None
+
+    def render(self):
+        """Start rendering, return `False` if there is nothing to render."""
+
+        first = next(self.lines, None)
+        if first is None:
+            return False
+        self.lines = chain([first], self.lines)
+
+        use_buffer = bool(load_settings().get("use_buffer", False))
+        if use_buffer:
+            self.view = self.win.new_file()
+            self.view.set_name(self.title)
+            self.view.set_scratch(True)
+        else:
+            self.view = self.win.create_output_panel('easy_diff')
+        self.view.assign_syntax('Packages/Diff/Diff.tmLanguage')
+        RENDERERS[self.view.id()] = self
+        self.append_chunk()
+        if not use_buffer:
+            self.win.run_command("show_panel", {"panel": "output.easy_diff"})
+        # Highlighting only runs while the result is shown, so start it after showing the panel.
+        highlight(self.view)
+        return True
+
+    def append_chunk(self):
+        """Append the next chunk and schedule the one after it."""
+
+        view_id = self.view.id()
+        if not self.view.is_valid() or RENDERERS.get(view_id) is not self:
+            return
+
+        chunk = []
+        size = 0
+        for line in self.lines:
+            chunk.append(line)
+            size += len(line) + 1
+            if size >= CHUNK_SIZE:
+                break
+
+        if not chunk:
+            del RENDERERS[view_id]
+            self.finished = self.view.change_count()
+            return
+
+        text = "\n".join(chunk)
+        if self.started:
+            text = "\n" + text
+        self.started = True
+        self.view.run_command('append', {'characters': text})
+        sublime.set_timeout(self.append_chunk, 10)
+
+    def extend(self, lines):
+        """
+        Queue more lines for rendering, return `False` if the result view is gone.
+
+        Rendering is resumed if everything queued so far has already been appended.
+        """
+
+        self.lines = chain(self.lines, lines)
+        if self.view is None:
+            return self.render()
+        view_id = self.view.id()
+        if not self.view.is_valid():
+            return False
+        if self.finished is None:
+            return RENDERERS.get(view_id) is self
+        if view_id in RENDERERS or self.view.change_count() != self.finished:
+            # Another diff has taken over the result view.
+            return False
+        self.finished = None
+        RENDERERS[view_id] = self
+        self.append_chunk()
+        return True
+
 
 class EasyDiffView(object):
     """Simulate the look of a view."""
@@ -54,6 +188,81 @@ class EasyDiffView(object):
         return len(self.content)
 
 
+class EasyDiffFile(object):
+    """Simulate the look of a view, but read the content lazily from the file on disk."""
+
+    def __init__(self, name, encoding=None):
+        """
+        Initialize.
+
+        If no encoding is given, it is detected from the file like Sublime would
+        (byte order mark, UTF-8, `default_encoding`, then `fallback_encoding`).
+        """
+
+        self.filename = name
+        if encoding is None:
+            prefs = sublime.load_settings("Preferences.sublime-settings")
+            encoding = fastcmp.detect_encoding(
+                name,
+                normalize_encoding(prefs.get("default_encoding", "UTF-8")),
+                normalize_encoding(prefs.get("fallback_encoding", "Western (Windows 1252)"))
+            )
+        self.encode = encoding
+        self.text = None
+        self.text_stat = None
+
+    def encoding(self):
+        """Return encoding."""
+
+        return self.encode
+
+    def get_time(self):
+        """Get the time."""
+
+        return time.ctime(osstat(self.filename).st_mtime)
+
+    def file_name(self):
+        """Get the file name."""
+
+        return self.filename
+
+    def substr(self, region):
+        """Get the desired region from the file (the decoded text is kept until the file changes)."""
+
+        st = osstat(self.filename)
+        key = (st.st_mtime, st.st_size)
+        if self.text is None or self.text_stat != key:
+            with io.open(self.filename, "r", encoding=get_encoding(self), errors="replace", newline='') as f:
+                self.text = f.read()
+            self.text_stat = key
+        return self.text[region.begin():region.end() + 1]
+
+    def size(self):
+        """Get the size."""
+
+        return osstat(self.filename).st_size
+
+    def digest(self):
+        """Get the SHA-1 digest of the file."""
+
+        h = hashlib.sha1()
+        with open(self.filename, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def iter_lines(self):
+        """
+        Iterate the lines of the file without reading the whole file into memory.
+
+        Lines are split like `split_lines` splits the text of views.
+        """
+
+        with io.open(self.filename, "r", encoding=get_encoding(self), errors="replace", newline=None) as f:
+            for line in f:
+                yield line[:-1] if line.endswith('\n') else line
+
+
 class EasyDiffInput(object):
     """Class for diff input."""
 
@@ -62,9 +271,30 @@ class EasyDiffInput(object):
 
         self.untitled = False
         self.temp_folder = None
+        self.table = engine.LineTable()
+        self.status = None if external else self.check_files(v1, v2)
         self.process_view(v1, LEFT, external)
         self.process_view(v2, RIGHT, external)
 
+    def check_files(self, v1, v2):
+        """
+        Check files on disk before reading them.
+
+        Identical and binary files are detected from a memory map so the text
+        never needs to be read.  Return `None` if a text diff is needed.
+        """
+
+        status = None
+        if isinstance(v1, EasyDiffFile) and isinstance(v2, EasyDiffFile):
+            status = fastcmp.compare_files(
+                v1.file_name(), v2.file_name(), get_encoding(v1), get_encoding(v2)
+            )
+        else:
+            for v in (v1, v2):
+                if isinstance(v, EasyDiffFile) and fastcmp.is_binary(v.file_name(), get_encoding(v)):
+                    status = fastcmp.BINARY
+        return None if status == fastcmp.DIFFERENT else status
+
     def process_view(self, view, side, external):
         """Process the view."""
 
@@ -80,13 +310,32 @@ class EasyDiffInput(object):
         self.set_buffer(view, external)
 
     def set_buffer(self, view, external):
-        """Set buffer."""
+        """Set buffer as interned line IDs along with a digest of the content."""
+
+        if external or self.status is not None:
+            bfr = array('i')
+            digest = None
+        elif isinstance(view, EasyDiffFile):
+            digest = view.digest()
+            bfr = self.table.intern(view.iter_lines())
+        else:
+            text = view.substr(sublime.Region(0, view.size()))
+            digest = hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()
+            bfr = self.table.intern(split_lines(text))
+        setattr(self, "b%d" % self.side, bfr)
+        setattr(self, "h%d" % self.side, digest)
 
-        setattr(
-            self,
-            "b%d" % self.side,
-            view.substr(sublime.Region(0, view.size())).splitlines() if not external else []
-        )
+    def identical(self):
+        """Check if both sides have the same content."""
+
+        if self.status is not None:
+            return self.status == fastcmp.IDENTICAL
+        return self.h1 == self.h2 or self.b1 == self.b2
+
+    def binary(self):
+        """Check if either side is binary."""
+
+        return self.status == fastcmp.BINARY
 
     def set_view(self, view):
         """Set the view."""
@@ -156,32 +405,195 @@ class EasyDiff(object):
         )
 
     @classmethod
-    def compare(cls, inputs):
-        """Compare the views."""
+    def compare(cls, v1, v2):
+        """Compare the views in the background."""
+
+        win = sublime.active_window()
+        diff_engine = load_settings().get("diff_engine", engine.DEFAULT_ENGINE)
+        start_job(
+            ("compare", cls.job_target(v1), cls.job_target(v2)),
+            lambda job: cls.diff(EasyDiffInput(v1, v2), diff_engine, job),
+            lambda result: cls.show(win, result)
+        )
+
+    @staticmethod
+    def job_target(view):
+        """Get an identifier for the view."""
+
+        return view.id() if isinstance(view, sublime.View) else view.file_name()
+
+    @classmethod
+    def diff(cls, inputs, diff_engine, job):
+        """Diff the inputs (async thread)."""
+
+        if inputs.identical():
+            return None
 
-        diff = difflib.unified_diff(
+        title = "EasyDiff: %s -> %s (%s)" % (basename(inputs.f1), basename(inputs.f2), time.ctime())
+        if inputs.binary():
+            return title, ["Binary files %s and %s differ" % (inputs.f1, inputs.f2)]
+
+        job.check()
+        key = ("compare", inputs.h1, inputs.h2, diff_engine)
+        opcodes = get_cached_diff(key)
+        if opcodes is None:
+            opcodes = tuple(engine.get_opcodes(inputs.b1, inputs.b2, diff_engine))
+            set_cached_diff(key, opcodes, len(opcodes) * OPCODE_SIZE)
+        job.check()
+
+        if all(code[0] == 'equal' for code in opcodes):
+            return None
+
+        diff = engine.unified_diff(
             inputs.b1, inputs.b2,
             inputs.f1, inputs.f2,
             inputs.t1, inputs.t2,
-            lineterm=''
+            lineterm='',
+            lines=inputs.table.lines,
+            opcodes=opcodes
         )
-        result = u"\n".join(line for line in diff)
+        return title, diff
 
-        if result == "":
+    @classmethod
+    def show(cls, win, result):
+        """Stream the diff into the result view (UI thread)."""
+
+        if result is None or not EasyDiffRenderer(win, *result).render():
             notify("No Difference")
-            return
 
-        use_buffer = bool(load_settings().get("use_buffer", False))
 
-        win = sublime.active_window()
-        if use_buffer:
-            v = win.new_file()
-            v.set_name("EasyDiff: %s -> %s (%s)" % (basename(inputs.f1), basename(inputs.f2), time.ctime()))
-            v.set_scratch(True)
-            v.assign_syntax('Packages/Diff/Diff.tmLanguage')
-            v.run_command('append', {'characters': result})
+class EasyDiffLive(object):
+    """
+    Live compare between two open views.
+
+    Edits to either view are diffed again in the background after a short delay.
+    Only the changes around the edited lines are diffed; the rest of the previous
+    alignment is reused.
+    """
+
+    def __init__(self, v1, v2, result):
+        """Initialize."""
+
+        self.views = (v1, v2)
+        self.result = result
+        self.table = engine.LineTable()
+        self.buffers = (array('i'), array('i'))
+        self.opcodes = None
+        self.version = 0
+        self.stopped = False
+        self.engine = load_settings().get("diff_engine", engine.DEFAULT_ENGINE)
+
+    @classmethod
+    def start(cls, win, v1, v2):
+        """Start a live compare."""
+
+        for v in (v1, v2):
+            live = LIVE.get(v.id())
+            if live is not None:
+                live.stop()
+
+        result = win.new_file()
+        result.set_name("EasyDiff Live: %s -> %s" % (cls.get_name(v1), cls.get_name(v2)))
+        result.set_scratch(True)
+        result.assign_syntax('Packages/Diff/Diff.tmLanguage')
+        highlight(result)
+
+        live = cls(v1, v2, result)
+        for v in (v1, v2, result):
+            LIVE[v.id()] = live
+        live.schedule(0)
+        return live
+
+    @staticmethod
+    def get_name(view):
+        """Get the view name."""
+
+        name = view.file_name()
+        return basename(name) if name is not None else "Untitled"
+
+    def stop(self):
+        """Stop the live compare."""
+
+        self.stopped = True
+        for key in [k for k, v in LIVE.items() if v is self]:
+            del LIVE[key]
+
+    def schedule(self, delay=None):
+        """Schedule an update, dropping any update that is still pending (debounce)."""
+
+        if delay is None:
+            delay = int(load_settings().get("live_diff_delay", 300))
+        self.version += 1
+        version = self.version
+        sublime.set_timeout_async(lambda: self.update(version), delay)
+
+    def update(self, version):
+        """Update the diff (async thread)."""
+
+        if version != self.version or self.stopped:
+            return
+        if not all(v.is_valid() for v in self.views + (self.result,)):
+            sublime.set_timeout(self.stop, 0)
+            return
+
+        new = tuple(self.table.intern(split_lines(v.substr(sublime.Region(0, v.size())))) for v in self.views)
+        if self.opcodes is None:
+            self.opcodes = engine.get_opcodes(new[0], new[1], self.engine)
         else:
-            v = win.create_output_panel('easy_diff')
-            v.assign_syntax('Packages/Diff/Diff.tmLanguage')
-            v.run_command('append', {'characters': result})
-            win.run_command("show_panel", {"panel": "output.easy_diff"})
+            a, b = self.buffers
+            for side in (0, 1):
+                old = self.buffers[side]
+                cur = new[side]
+                if old == cur:
+                    continue
+                head = engine.common_prefix(old, cur)
+                tail = engine.common_suffix(old, cur, head)
+                if side == 0:
+                    a = cur
+                else:
+                    b = cur
+                self.opcodes = engine.update_opcodes(
+                    self.opcodes, a, b, side, head, len(old) - tail, len(cur) - tail, self.engine
+                )
+        if len(self.table.lines) > 2 * (len(new[0]) + len(new[1])):
+            new = self.compact(new)
+        self.buffers = new
+
+        now = time.ctime()
+        text = "\n".join(
+            engine.unified_diff(
+                new[0], new[1],
+                self.get_name(self.views[0]), self.get_name(self.views[1]),
+                now, now,
+                lineterm='',
+                lines=self.table.lines,
+                opcodes=self.opcodes
+            )
+        )
+        sublime.set_timeout(lambda: self.show(text, version), 0)
+
+    def compact(self, buffers):
+        """
+        Rebuild the line table from the current buffers.
+
+        Every version of an edited line stays in the table, so it is rebuilt when it grows
+        well past the size of the views.  The opcodes refer to positions and stay valid.
+        """
+
+        lines = self.table.lines
+        table = engine.LineTable()
+        buffers = tuple(table.intern(lines[x] for x in buf) for buf in buffers)
+        self.table = table
+        return buffers
+
+    def show(self, text, version):
+        """Show the updated diff (UI thread)."""
+
+        if version != self.version or self.stopped:
+            return
+        if not self.result.is_valid():
+            self.stop()
+            return
+        self.result.run_command("easy_diff_replace", {"text": text})
+        if text == "":
+            notify("No Difference")
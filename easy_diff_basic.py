@@ -7,9 +7,9 @@ License: MIT
 import sublime
 import sublime_plugin
 from os.path import basename
-from EasyDiff.easy_diff_global import load_settings, log, get_external_diff, get_target, get_group_view
+from EasyDiff.easy_diff_global import load_settings, log, get_external_diff, get_target, get_group_view, notify
 from EasyDiff.easy_diff_dynamic_menu import update_menu
-from EasyDiff.easy_diff import EasyDiffView, EasyDiffInput, EasyDiff
+from EasyDiff.easy_diff import EasyDiffView, EasyDiffFile, EasyDiffInput, EasyDiff, EasyDiffLive, LIVE
 
 LEFT = None
 
@@ -17,12 +17,8 @@ LEFT = None
 ###############################
 # Helper Functions
 ###############################
-def diff(left, right, external=False):
-    """
-    Initiate diff by getting left side and right side compare.
-
-    Call the appropriate diff method and call internal or external diff.
-    """
+def get_views(left, right):
+    """Get the left and right view (or clip) objects."""
 
     lw = None
     rw = None
@@ -55,16 +51,40 @@ def diff(left, right, external=False):
         if right["clip"]:
             rv = right["clip"]
 
+    return lv, rv
+
+
+def diff(left, right, external=False):
+    """
+    Initiate diff by getting left side and right side compare.
+
+    Call the appropriate diff method and call internal or external diff.
+    """
+
+    lv, rv = get_views(left, right)
+
     if lv is not None and rv is not None:
         ext_diff = get_external_diff()
         if external:
             EasyDiff.extcompare(EasyDiffInput(lv, rv, external=True), ext_diff)
         else:
-            EasyDiff.compare(EasyDiffInput(lv, rv))
+            EasyDiff.compare(lv, rv)
     else:
         log("Can't compare")
 
 
+def live_diff(window, left, right):
+    """Start a live compare between two open views."""
+
+    lv, rv = get_views(left, right)
+
+    if isinstance(lv, sublime.View) and isinstance(rv, sublime.View):
+        EasyDiffLive.start(window, lv, rv)
+    else:
+        log("Can't live compare")
+        notify("Can't live compare")
+
+
 def get_mru_window(win_id):
     """Get MRU window."""
 
@@ -103,6 +123,13 @@ def panel_enable_check(method="view", external=False):
             LEFT is not None and
             bool(load_settings().get("quick_panel_left_right_commands", True))
         )
+    elif method == "live":
+        enabled = (
+            not external and
+            LEFT is not None and
+            LEFT.get("clip") is None and
+            bool(load_settings().get("quick_panel_left_right_commands", True))
+        )
     elif method == "mru":
         current = get_mru_view(EasyDiffListener.current)
         last = get_mru_view(EasyDiffListener.last)
@@ -189,7 +216,9 @@ class EasyDiffSetLeftCommand(sublime_plugin.WindowCommand, _EasyDiffSelection):
         global LEFT
         self.external = external
         self.set_view(paths, group, index)
-        if self.view is not None:
+        if self.file is not None:
+            LEFT = {"win_id": None, "view_id": None, "clip": self.file}
+        elif self.view is not None:
             if bool(load_settings().get("use_selections", True)) and self.has_selections():
                 LEFT = {
                     "win_id": None, "view_id": None,
@@ -202,17 +231,22 @@ class EasyDiffSetLeftCommand(sublime_plugin.WindowCommand, _EasyDiffSelection):
                     name = "Untitled"
 
     def set_view(self, paths, group=-1, index=-1, open_file=True):
-        """Set view."""
+        """
+        Set view.
+
+        Paths that are not already open are read from disk (`self.file`)
+        instead of opening them in a view.
+        """
 
         self.view = None
+        self.file = None
         if len(paths):
             file_path = get_target(paths)
             if file_path is None:
                 return
-            if open_file:
-                self.view = self.window.open_file(file_path)
-            else:
-                self.view = self.window.find_open_file(file_path)
+            self.view = self.window.find_open_file(file_path)
+            if self.view is None and open_file:
+                self.file = EasyDiffFile(file_path)
         elif index != -1:
             self.view = get_group_view(self.window, group, index)
         else:
@@ -237,14 +271,35 @@ class EasyDiffSetLeftCommand(sublime_plugin.WindowCommand, _EasyDiffSelection):
 class EasyDiffCompareBothCommand(sublime_plugin.WindowCommand, _EasyDiffSelection):
     """Compare window command."""
 
-    def run(self, external=False, clipboard=False, paths=[], group=-1, index=-1):
+    def run(self, external=False, clipboard=False, live=False, paths=[], group=-1, index=-1):
         """Run command."""
 
         self.external = external
         self.clipboard = clipboard
         self.set_view(paths, group, index)
-        if self.view is not None:
-            self.diff()
+        if self.file is not None:
+            if live:
+                # Live compares need a view, so open the file.
+                self.view = self.window.open_file(self.file.file_name())
+                self.live_diff()
+            else:
+                self.diff()
+        elif self.view is not None:
+            if live:
+                self.live_diff()
+            else:
+                self.diff()
+
+    def live_diff(self):
+        """Start a live compare once the view has loaded."""
+
+        if not self.view.is_valid():
+            return
+        if self.view.is_loading():
+            sublime.set_timeout(self.live_diff, 100)
+            return
+        right = {"win_id": self.view.window().id(), "view_id": self.view.id(), "clip": None}
+        live_diff(self.window, LEFT, right)
 
     def diff(self):
         """Diff."""
@@ -265,7 +320,10 @@ class EasyDiffCompareBothCommand(sublime_plugin.WindowCommand, _EasyDiffSelectio
 
     def get_right(self):
         """Get right."""
-        if self.has_selections():
+
+        if self.file is not None:
+            right = {"win_id": None, "view_id": None, "clip": self.file}
+        elif self.has_selections():
             right = {
                 "win_id": None, "view_id": None,
                 "clip": EasyDiffView("sel", self.get_selections(), self.get_encoding())
@@ -275,26 +333,38 @@ class EasyDiffCompareBothCommand(sublime_plugin.WindowCommand, _EasyDiffSelectio
         return right
 
     def set_view(self, paths, group=-1, index=-1, open_file=True):
-        """Set view."""
+        """
+        Set view.
+
+        Paths that are not already open are read from disk (`self.file`)
+        instead of opening them in a view.
+        """
 
         self.view = None
+        self.file = None
         if len(paths):
             file_path = get_target(paths)
             if file_path is None:
                 return
-            if open_file:
-                self.view = self.window.open_file(file_path)
-            else:
-                self.view = self.window.find_open_file(file_path)
+            self.view = self.window.find_open_file(file_path)
+            if self.view is None and open_file:
+                self.file = EasyDiffFile(file_path)
         elif index != -1:
             self.view = get_group_view(self.window, group, index)
         else:
             self.view = self.window.active_view()
 
-    def is_enabled(self, clipboard=False, external=False, paths=[], group=-1, index=-1):
+    def is_enabled(self, clipboard=False, external=False, live=False, paths=[], group=-1, index=-1):
         """Check if command is enabled."""
 
-        if clipboard:
+        if live:
+            enabled = (
+                not external and
+                LEFT is not None and
+                LEFT.get("clip") is None and
+                (get_target(paths, group, index) is not None if len(paths) or index != -1 else True)
+            )
+        elif clipboard:
             enabled = (
                 bool(load_settings().get("use_clipboard", True)) and
                 (get_target(paths, group, index) is not None if len(paths) or index != -1 else True)
@@ -306,7 +376,7 @@ class EasyDiffCompareBothCommand(sublime_plugin.WindowCommand, _EasyDiffSelectio
             )
         return enabled
 
-    def is_visible(self, clipboard=False, external=False, paths=[], group=-1, index=-1):
+    def is_visible(self, clipboard=False, external=False, live=False, paths=[], group=-1, index=-1):
         """Check if visible in menu."""
 
         return bool(load_settings().get("use_clipboard", True)) if clipboard else True
@@ -318,7 +388,9 @@ class EasyDiffCompareBothCommand(sublime_plugin.WindowCommand, _EasyDiffSelectio
         if LEFT is not None:
             left = LEFT.get("clip")
             name = None
-            if left is not None:
+            if isinstance(left, EasyDiffFile):
+                name = '"%s"' % basename(left.file_name())
+            elif left is not None:
                 name = "[%s]" % left.file_name()
             else:
                 win_id = LEFT.get("win_id")
@@ -340,11 +412,13 @@ class EasyDiffCompareBothCommand(sublime_plugin.WindowCommand, _EasyDiffSelectio
                         name = '"%s"' % basename(name)
         return name
 
-    def description(self, external=False, clipboard=False, paths=[], group=-1, index=-1):
+    def description(self, external=False, clipboard=False, live=False, paths=[], group=-1, index=-1):
         """Return menu description."""
 
         self.set_view(paths, group, index, False)
-        if clipboard:
+        if live:
+            description = "EasyDiff Live Compare with %s" % self.get_left_name()
+        elif clipboard:
             if self.view is not None and bool(load_settings().get("use_selections", True)) and self.has_selections():
                 description = "%sDiff Compare [sel] with Clipboard" % ('' if external else 'Easy')
             else:
@@ -449,6 +523,13 @@ class EasyDiffPanelCommand(sublime_plugin.TextCommand, _EasyDiffSelection):
             "type": "window",
             "condition": "compare"
         },
+        {
+            "caption": "Live Compare with %(file)s",
+            "cmd": "easy_diff_compare_both",
+            "args": {"live": True},
+            "type": "window",
+            "condition": "live"
+        },
         {
             "caption": "Quick Compare: Current %(selections)s with Clipboard",
             "cmd": "easy_diff_compare_both",
@@ -581,7 +662,9 @@ class EasyDiffPanelCommand(sublime_plugin.TextCommand, _EasyDiffSelection):
         if LEFT is not None:
             left = LEFT.get("clip")
             name = None
-            if left is not None:
+            if isinstance(left, EasyDiffFile):
+                name = basename(left.file_name())
+            elif left is not None:
                 name = left.file_name()
             else:
                 win_id = LEFT.get("win_id")
@@ -619,6 +702,18 @@ class EasyDiffPanelCommand(sublime_plugin.TextCommand, _EasyDiffSelection):
         ) and bool(load_settings().get("quick_panel_commands", True))
 
 
+###############################
+# Live Compare Output
+###############################
+class EasyDiffReplaceCommand(sublime_plugin.TextCommand):
+    """Replace the content of the view."""
+
+    def run(self, edit, text=""):
+        """Run command."""
+
+        self.view.replace(edit, sublime.Region(0, self.view.size()), text)
+
+
 ###############################
 # View Close Listener
 ###############################
@@ -635,6 +730,16 @@ class EasyDiffListener(sublime_plugin.EventListener):
         vid = view.id()
         if LEFT is not None and vid == LEFT["view_id"]:
             LEFT = None
+        live = LIVE.get(vid)
+        if live is not None:
+            live.stop()
+
+    def on_modified_async(self, view):
+        """Update live compares."""
+
+        live = LIVE.get(view.id())
+        if live is not None and view.id() != live.result.id():
+            live.schedule()
 
     def on_activated(self, view):
         """Track last activated view."""
@@ -73,6 +73,10 @@ INTERNAL_MENU = '''{ "caption": "-" },
     {
         "command": "easy_diff_compare_both"
     },
+    {
+        "command": "easy_diff_compare_both",
+        "args": {"live": true}
+    },
     {
         "command": "easy_diff_compare_both",
         "args": {"clipboard": true}
@@ -111,6 +115,16 @@ SVN_INTERNAL_MENU = '''
                 "command": "easy_diff_svn",
                 "args": {"last": true}
             },
+            {
+                "caption": "SVN Diff with Revision...",
+                "command": "easy_diff_svn",
+                "args": {"pick": true}
+            },
+            {
+                "caption": "SVN Diff All Changes",
+                "command": "easy_diff_svn",
+                "args": {"changes": true}
+            },
             {
                 "caption": "SVN Revert",
                 "command": "easy_diff_svn",
@@ -128,6 +142,16 @@ GIT_INTERNAL_MENU = '''
                 "command": "easy_diff_git",
                 "args": {"last": true}
             },
+            {
+                "caption": "Git Diff with Revision...",
+                "command": "easy_diff_git",
+                "args": {"pick": true}
+            },
+            {
+                "caption": "Git Diff All Changes",
+                "command": "easy_diff_git",
+                "args": {"changes": true}
+            },
             {
                 "caption": "Git Revert",
                 "command": "easy_diff_git",
@@ -145,6 +169,16 @@ HG_INTERNAL_MENU = '''
                 "command": "easy_diff_hg",
                 "args": {"last": true}
             },
+            {
+                "caption": "Mercurial Diff with Revision...",
+                "command": "easy_diff_hg",
+                "args": {"pick": true}
+            },
+            {
+                "caption": "Mercurial Diff All Changes",
+                "command": "easy_diff_hg",
+                "args": {"changes": true}
+            },
             {
                 "caption": "Mercurial Revert",
                 "command": "easy_diff_hg",
@@ -163,6 +197,11 @@ SVN_EXTERNAL_MENU = '''
                 "command": "easy_diff_svn",
                 "args": {"external": true, "last": true}
             },
+            {
+                "caption": "SVN Diff with Revision...",
+                "command": "easy_diff_svn",
+                "args": {"external": true, "pick": true}
+            },
             {
                 "caption": "SVN Revert",
                 "command": "easy_diff_svn",
@@ -181,6 +220,11 @@ GIT_EXTERNAL_MENU = '''
                 "command": "easy_diff_git",
                 "args": {"external": true, "last": true}
             },
+            {
+                "caption": "Git Diff with Revision...",
+                "command": "easy_diff_git",
+                "args": {"external": true, "pick": true}
+            },
             {
                 "caption": "Git Revert",
                 "command": "easy_diff_git",
@@ -199,6 +243,11 @@ HG_EXTERNAL_MENU = '''
                 "command": "easy_diff_hg",
                 "args": {"external": true, "last": true}
             },
+            {
+                "caption": "Mercurial Diff with Revision...",
+                "command": "easy_diff_hg",
+                "args": {"external": true, "pick": true}
+            },
             {
                 "caption": "Mercurial Revert",
                 "command": "easy_diff_hg",
@@ -258,6 +307,16 @@ SVN_SIDEBAR_INTERNAL_MENU = '''
                 "command": "easy_diff_svn",
                 "args": {"last": true, "paths": []}
             },
+            {
+                "caption": "SVN Diff with Revision...",
+                "command": "easy_diff_svn",
+                "args": {"pick": true, "paths": []}
+            },
+            {
+                "caption": "SVN Diff All Changes",
+                "command": "easy_diff_svn",
+                "args": {"changes": true, "paths": []}
+            },
             {
                 "caption": "SVN Revert",
                 "command": "easy_diff_svn",
@@ -276,6 +335,16 @@ GIT_SIDEBAR_INTERNAL_MENU = '''
                 "command": "easy_diff_git",
                 "args": {"last": true, "paths": []}
             },
+            {
+                "caption": "Git Diff with Revision...",
+                "command": "easy_diff_git",
+                "args": {"pick": true, "paths": []}
+            },
+            {
+                "caption": "Git Diff All Changes",
+                "command": "easy_diff_git",
+                "args": {"changes": true, "paths": []}
+            },
             {
                 "caption": "Git Revert",
                 "command": "easy_diff_git",
@@ -294,6 +363,16 @@ HG_SIDEBAR_INTERNAL_MENU = '''
                 "command": "easy_diff_hg",
                 "args": {"last": true, "paths": []}
             },
+            {
+                "caption": "Mercurial Diff with Revision...",
+                "command": "easy_diff_hg",
+                "args": {"pick": true, "paths": []}
+            },
+            {
+                "caption": "Mercurial Diff All Changes",
+                "command": "easy_diff_hg",
+                "args": {"changes": true, "paths": []}
+            },
             {
                 "caption": "Mercurial Revert",
                 "command": "easy_diff_hg",
@@ -312,6 +391,11 @@ SVN_SIDEBAR_EXTERNAL_MENU = '''
                 "command": "easy_diff_svn",
                 "args": {"external": true, "last": true, "paths": []}
             },
+            {
+                "caption": "SVN Diff with Revision...",
+                "command": "easy_diff_svn",
+                "args": {"external": true, "pick": true, "paths": []}
+            },
             {
                 "caption": "SVN Revert",
                 "command": "easy_diff_svn",
@@ -330,6 +414,11 @@ GIT_SIDEBAR_EXTERNAL_MENU = '''
                 "command": "easy_diff_git",
                 "args": {"external": true, "last": true, "paths": []}
             },
+            {
+                "caption": "Git Diff with Revision...",
+                "command": "easy_diff_git",
+                "args": {"external": true, "pick": true, "paths": []}
+            },
             {
                 "caption": "Git Revert",
                 "command": "easy_diff_git",
@@ -348,6 +437,11 @@ HG_SIDEBAR_EXTERNAL_MENU = '''
                 "command": "easy_diff_hg",
                 "args": {"external": true, "last": true, "paths": []}
             },
+            {
+                "caption": "Mercurial Diff with Revision...",
+                "command": "easy_diff_hg",
+                "args": {"external": true, "pick": true, "paths": []}
+            },
             {
                 "caption": "Mercurial Revert",
                 "command": "easy_diff_hg",
@@ -368,6 +462,10 @@ INTERNAL_TAB_MENU = '''{ "caption": "-" },
         "command": "easy_diff_compare_both",
         "args": {"group": -1, "index": -1}
     },
+    {
+        "command": "easy_diff_compare_both",
+        "args": {"live": true, "group": -1, "index": -1}
+    },
     {
         "command": "easy_diff_compare_both",
         "args": {"clipboard": true, "group": -1, "index": -1}
@@ -407,6 +505,16 @@ SVN_TAB_INTERNAL_MENU = '''
                 "command": "easy_diff_svn",
                 "args": {"last": true, "group": -1, "index": -1}
             },
+            {
+                "caption": "SVN Diff with Revision...",
+                "command": "easy_diff_svn",
+                "args": {"pick": true, "group": -1, "index": -1}
+            },
+            {
+                "caption": "SVN Diff All Changes",
+                "command": "easy_diff_svn",
+                "args": {"changes": true, "group": -1, "index": -1}
+            },
             {
                 "caption": "SVN Revert",
                 "command": "easy_diff_svn",
@@ -425,6 +533,16 @@ GIT_TAB_INTERNAL_MENU = '''
                 "command": "easy_diff_git",
                 "args": {"last": true, "group": -1, "index": -1}
             },
+            {
+                "caption": "Git Diff with Revision...",
+                "command": "easy_diff_git",
+                "args": {"pick": true, "group": -1, "index": -1}
+            },
+            {
+                "caption": "Git Diff All Changes",
+                "command": "easy_diff_git",
+                "args": {"changes": true, "group": -1, "index": -1}
+            },
             {
                 "caption": "Git Revert",
                 "command": "easy_diff_git",
@@ -443,6 +561,16 @@ HG_TAB_INTERNAL_MENU = '''
                 "command": "easy_diff_hg",
                 "args": {"last": true, "group": -1, "index": -1}
             },
+            {
+                "caption": "Mercurial Diff with Revision...",
+                "command": "easy_diff_hg",
+                "args": {"pick": true, "group": -1, "index": -1}
+            },
+            {
+                "caption": "Mercurial Diff All Changes",
+                "command": "easy_diff_hg",
+                "args": {"changes": true, "group": -1, "index": -1}
+            },
             {
                 "caption": "Mercurial Revert",
                 "command": "easy_diff_hg",
@@ -461,6 +589,11 @@ SVN_TAB_EXTERNAL_MENU = '''
                 "command": "easy_diff_svn",
                 "args": {"external": true, "last": true, "group": -1, "index": -1}
             },
+            {
+                "caption": "SVN Diff with Revision...",
+                "command": "easy_diff_svn",
+                "args": {"external": true, "pick": true, "group": -1, "index": -1}
+            },
             {
                 "caption": "SVN Revert",
                 "command": "easy_diff_svn",
@@ -479,6 +612,11 @@ GIT_TAB_EXTERNAL_MENU = '''
                 "command": "easy_diff_git",
                 "args": {"external": true, "last": true, "group": -1, "index": -1}
             },
+            {
+                "caption": "Git Diff with Revision...",
+                "command": "easy_diff_git",
+                "args": {"external": true, "pick": true, "group": -1, "index": -1}
+            },
             {
                 "caption": "Git Revert",
                 "command": "easy_diff_git",
@@ -497,6 +635,11 @@ HG_TAB_EXTERNAL_MENU = '''
                 "command": "easy_diff_hg",
                 "args": {"external": true, "last": true, "group": -1, "index": -1}
             },
+            {
+                "caption": "Mercurial Diff with Revision...",
+                "command": "easy_diff_hg",
+                "args": {"external": true, "pick": true, "group": -1, "index": -1}
+            },
             {
                 "caption": "Mercurial Revert",
                 "command": "easy_diff_hg",
@@ -7,6 +7,7 @@ License: MIT
 import sublime
 from os.path import exists, normpath, abspath, isdir
 from EasyDiff.lib.multiconf import get as multiget
+from EasyDiff.lib.cache import LRUCache
 import re
 try:
     from SubNotify.sub_notify import SubNotifyIsReadyCommand as Notify
@@ -22,6 +23,7 @@ except Exception:
 
 DEBUG = False
 SETTINGS = "easy_diff.sublime-settings"
+DIFF_CACHE = LRUCache()
 
 
 def get_group_view(window, group, index):
@@ -60,6 +62,7 @@ def global_reload():
 
     set_debug_flag()
     settings = load_settings()
+    DIFF_CACHE.resize(max(0, int(settings.get("diff_cache_size", 16))) * 1024 * 1024)
     settings.clear_on_change('reload_global')
     settings.add_on_change('reload_global', global_reload)
 
@@ -76,14 +79,18 @@ def set_debug_flag():
 def get_encoding(view):
     """Get the file encoding."""
 
-    encoding = view.encoding()
+    return normalize_encoding(view.encoding())
+
+
+def normalize_encoding(encoding):
+    """Convert a Sublime encoding name to a Python codec name."""
+
     mapping = [
         ("with BOM", ""),
         ("Windows", "cp"),
         ("-", "_"),
         (" ", "")
     ]
-    encoding = view.encoding()
     m = re.match(r'.+\((.*)\)', encoding)
     if m is not None:
         encoding = m.group(1)
@@ -122,6 +129,20 @@ def get_target(paths=[], group=-1, index=-1):
     return target
 
 
+def get_cached_diff(key):
+    """Get a diff result from the cache."""
+
+    value = DIFF_CACHE.get(key)
+    debug("diff cache %s (%s)" % ("miss" if value is None else "hit", DIFF_CACHE.stats()))
+    return value
+
+
+def set_cached_diff(key, value, size):
+    """Store a diff result in the cache."""
+
+    DIFF_CACHE.put(key, value, size)
+
+
 def notify(msg):
     """Notify with SubNotify if possible and enabled."""
 
@@ -0,0 +1,192 @@
+"""
+Easy Diff Intra-line Highlight.
+
+Copyright (c) 2013 - 2015 Isaac Muse <isaacmuse@gmail.com>
+License: MIT
+"""
+import sublime
+import sublime_plugin
+import threading
+import EasyDiff.lib.engine as engine
+from EasyDiff.easy_diff_global import load_settings
+
+RESULT_SETTING = "easy_diff_result"
+DELETED_KEY = "easy_diff_intraline_deleted"
+INSERTED_KEY = "easy_diff_intraline_inserted"
+
+# How far to look outside the visible region for the rest of a partially visible hunk.
+MAX_SCAN = 500
+
+# How often (in milliseconds) to check if the visible region has changed.
+POLL_DELAY = 250
+
+HIGHLIGHTERS = {}
+
+
+class IntralineHighlighter(object):
+    """Highlight changed spans inside modified line pairs of the visible hunks."""
+
+    def __init__(self, view):
+        """Initialize."""
+
+        self.view = view
+        self.lock = threading.Lock()
+        self.watching = False
+        self.dirty = False
+        self.reset()
+
+    def reset(self):
+        """Forget what has been highlighted."""
+
+        self.done = set()
+        self.deleted = []
+        self.inserted = []
+        self.visible = None
+
+    def is_shown(self):
+        """Check if the view is the active view or the shown output panel."""
+
+        window = self.view.window()
+        if window is None:
+            return False
+        active = window.active_view()
+        return (
+            (active is not None and active.id() == self.view.id()) or
+            window.active_panel() == "output.easy_diff"
+        )
+
+    def watch(self):
+        """Poll the visible region while the view is shown (resumed when it is activated or the panel is shown)."""
+
+        if (
+            not self.view.is_valid() or
+            HIGHLIGHTERS.get(self.view.id()) is not self or
+            not self.is_shown()
+        ):
+            self.watching = False
+            return
+        self.watching = True
+        visible = self.view.visible_region()
+        if self.dirty or (visible.begin(), visible.end()) != self.visible:
+            sublime.set_timeout_async(self.update, 0)
+        sublime.set_timeout(self.watch, POLL_DELAY)
+
+    def update(self):
+        """Highlight the hunks in the visible region (async thread)."""
+
+        with self.lock:
+            view = self.view
+            if not view.is_valid():
+                return
+            if self.dirty:
+                self.dirty = False
+                self.reset()
+            visible = view.visible_region()
+            if (visible.begin(), visible.end()) == self.visible:
+                return
+            self.visible = (visible.begin(), visible.end())
+            budget = int(load_settings().get("intraline_budget", 100000))
+
+            # Extend the region so that runs of changed lines cut off at the edges are complete.
+            first = view.rowcol(visible.begin())[0]
+            last = view.rowcol(visible.end())[0]
+            last_row = view.rowcol(view.size())[0]
+            count = 0
+            while first > 0 and count < MAX_SCAN and self.get_line(first - 1)[:1] in ('-', '+'):
+                first -= 1
+                count += 1
+            count = 0
+            while last < last_row and count < MAX_SCAN and self.get_line(last + 1)[:1] in ('-', '+'):
+                last += 1
+                count += 1
+
+            minus = []
+            plus = []
+            region = sublime.Region(view.text_point(first, 0), view.line(view.text_point(last, 0)).end())
+            for line in view.lines(region):
+                text = view.substr(line)
+                prefix = text[:1]
+                if prefix == '-' and not plus:
+                    minus.append((line, text))
+                elif prefix == '+' and minus:
+                    plus.append((line, text))
+                else:
+                    self.highlight_run(minus, plus, budget)
+                    minus = [(line, text)] if prefix == '-' else []
+                    plus = []
+            self.highlight_run(minus, plus, budget)
+
+            view.add_regions(DELETED_KEY, self.deleted, "diff.deleted.char", "", sublime.DRAW_NO_OUTLINE)
+            view.add_regions(INSERTED_KEY, self.inserted, "diff.inserted.char", "", sublime.DRAW_NO_OUTLINE)
+
+    def get_line(self, row):
+        """Get the text of the given row."""
+
+        return self.view.substr(self.view.line(self.view.text_point(row, 0)))
+
+    def highlight_run(self, minus, plus, budget):
+        """Pair up removed and added lines and find the changed spans between them."""
+
+        if not minus or not plus:
+            return
+        key = minus[0][0].begin()
+        if key in self.done:
+            return
+        self.done.add(key)
+
+        # Skip the file header.
+        if len(minus) == 1 and len(plus) == 1 and minus[0][1].startswith('--- ') and plus[0][1].startswith('+++ '):
+            return
+
+        for (line_a, text_a), (line_b, text_b) in zip(minus, plus):
+            spans = engine.intraline_spans(text_a[1:], text_b[1:], budget)
+            if spans is None:
+                continue
+            start_a = line_a.begin() + 1
+            start_b = line_b.begin() + 1
+            self.deleted.extend(sublime.Region(start_a + s, start_a + e) for s, e in spans[0])
+            self.inserted.extend(sublime.Region(start_b + s, start_b + e) for s, e in spans[1])
+
+
+def highlight(view):
+    """Start intra-line highlighting for a diff result view."""
+
+    view.settings().set(RESULT_SETTING, True)
+    if not bool(load_settings().get("intraline_highlight", True)):
+        return
+    highlighter = HIGHLIGHTERS.get(view.id())
+    if highlighter is None:
+        highlighter = IntralineHighlighter(view)
+        HIGHLIGHTERS[view.id()] = highlighter
+    if not highlighter.watching:
+        highlighter.watch()
+
+
+class EasyDiffHighlightListener(sublime_plugin.EventListener):
+    """Listener for intra-line highlighting."""
+
+    def on_activated(self, view):
+        """Resume highlighting when a result view is activated."""
+
+        if view.settings().get(RESULT_SETTING, False):
+            highlight(view)
+
+    def on_post_window_command(self, window, command, args):
+        """Resume highlighting when the result panel is shown again (panels don't get `on_activated`)."""
+
+        if command == "show_panel" and (args or {}).get("panel") == "output.easy_diff":
+            view = window.find_output_panel("easy_diff")
+            if view is not None and view.settings().get(RESULT_SETTING, False):
+                highlight(view)
+
+    def on_modified(self, view):
+        """Highlight again when the result changes."""
+
+        highlighter = HIGHLIGHTERS.get(view.id())
+        if highlighter is not None:
+            highlighter.dirty = True
+
+    def on_close(self, view):
+        """Stop highlighting."""
+
+        HIGHLIGHTERS.pop(view.id(), None)
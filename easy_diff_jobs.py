@@ -0,0 +1,140 @@
+"""
+Easy Diff Jobs.
+
+Copyright (c) 2013 - 2015 Isaac Muse <isaacmuse@gmail.com>
+License: MIT
+"""
+import sublime
+import sublime_plugin
+import threading
+from EasyDiff.easy_diff_global import log, debug, notify
+
+STATUS_KEY = "easy_diff_job"
+STATUS_MSG = "Diff in progress…"
+
+JOBS = {}
+
+
+class JobCancelled(Exception):
+    """Job was cancelled."""
+
+
+class DiffJob(object):
+    """
+    A diff job.
+
+    The work is done on the async thread and the result is handed back to the UI thread.
+    """
+
+    def __init__(self, key, work, done):
+        """Initialize."""
+
+        self.key = key
+        self.work = work
+        self.done = done
+        self.event = threading.Event()
+        window = sublime.active_window()
+        self.view = window.active_view() if window is not None else None
+
+    @property
+    def cancelled(self):
+        """Check if job is cancelled."""
+
+        return self.event.is_set()
+
+    def cancel(self):
+        """Cancel the job."""
+
+        self.event.set()
+
+    def check(self):
+        """Abort the work if the job has been cancelled."""
+
+        if self.event.is_set():
+            raise JobCancelled
+
+    def run(self):
+        """Run the work (async thread)."""
+
+        result = None
+        failed = False
+        try:
+            self.check()
+            result = self.work(self)
+        except JobCancelled:
+            # Still let `finish` forget the job and clear the status.
+            pass
+        except Exception as e:
+            log(e)
+            failed = True
+        sublime.set_timeout(lambda: self.finish(result, failed), 0)
+
+    def finish(self, result, failed):
+        """Hand the result to the UI (UI thread)."""
+
+        if JOBS.get(self.key) is self:
+            del JOBS[self.key]
+        update_status(self)
+        if self.cancelled:
+            debug("job %s cancelled" % str(self.key))
+        elif failed:
+            notify("Diff failed!")
+        else:
+            self.done(result)
+
+
+def update_status(job):
+    """Show or clear the progress status on the job's view."""
+
+    if job.view is None or not job.view.is_valid():
+        return
+    busy = any(j.view is not None and j.view.id() == job.view.id() for j in JOBS.values())
+    if busy:
+        job.view.set_status(STATUS_KEY, STATUS_MSG)
+    else:
+        job.view.erase_status(STATUS_KEY)
+
+
+def start_job(key, work, done):
+    """
+    Start a job.
+
+    `work` is called with the job on the async thread and should call `job.check()`
+    between expensive steps.  `done` is called with the result on the UI thread.
+    A newer job with the same key cancels the older one.
+    """
+
+    old = JOBS.get(key)
+    if old is not None:
+        debug("cancelling older job %s" % str(key))
+        old.cancel()
+    job = DiffJob(key, work, done)
+    JOBS[key] = job
+    update_status(job)
+    sublime.set_timeout_async(job.run, 0)
+    return job
+
+
+def cancel_jobs():
+    """Cancel all running jobs."""
+
+    jobs = list(JOBS.values())
+    JOBS.clear()
+    for job in jobs:
+        job.cancel()
+        update_status(job)
+
+
+class EasyDiffCancelCommand(sublime_plugin.WindowCommand):
+    """Cancel running diffs."""
+
+    def run(self):
+        """Run command."""
+
+        cancel_jobs()
+        notify("Diff cancelled")
+
+    def is_enabled(self):
+        """Check if command is enabled."""
+
+        return len(JOBS) > 0
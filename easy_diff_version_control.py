@@ -11,16 +11,227 @@ from os.path import basename, splitext, join, exists
 import EasyDiff.lib.svn as svn
 import EasyDiff.lib.git as git
 import EasyDiff.lib.hg as hg
+import EasyDiff.lib.runner as runner
 from EasyDiff.lib.multiconf import get as multiget
-from EasyDiff.easy_diff_global import load_settings, log, debug, get_encoding
+from EasyDiff.easy_diff_global import load_settings, log, debug, get_encoding, get_cached_diff, set_cached_diff
 from EasyDiff.easy_diff_global import get_external_diff, get_target, notify, get_group_view
+from EasyDiff.easy_diff_jobs import start_job
+from EasyDiff.easy_diff import EasyDiffRenderer, EasyDiff, EasyDiffInput, EasyDiffView, iter_lines
+import EasyDiff.lib.engine as engine
+from concurrent.futures import ThreadPoolExecutor
 import subprocess
 import tempfile
+import hashlib
+import threading
+import time
 
 SVN_ENABLED = None
 GIT_ENABLED = None
 HG_ENABLED = None
 
+# Number of log records loaded at a time by the revision picker.
+HISTORY_PAGE_SIZE = 50
+
+# Delay (in milliseconds) before prefetching the highlighted revision.
+PREFETCH_DELAY = 100
+
+
+###############################
+# Versioned State Cache
+###############################
+class VersionedCache(object):
+    """
+    Cache of whether files are versioned under each version control.
+
+    Entries are filled in the background (when a view is activated or loaded), so evaluating
+    whether menu commands are enabled never has to run a version control process.
+    Entries expire when the file is saved or when they are older than `versioned_cache_ttl` seconds;
+    expired entries are still used until the background check replaces them.
+    """
+
+    def __init__(self):
+        """Initialize."""
+
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.pending = set()
+        self.checkers = []
+
+    def get(self, control_type, name):
+        """Get the cached state, even if it has expired (`None` if the file has never been checked)."""
+
+        with self.lock:
+            entry = self.entries.get((control_type, name))
+        return entry[0] if entry is not None else None
+
+    def expired(self, control_type, name):
+        """Check if the cached state is missing or needs to be checked again."""
+
+        ttl = float(load_settings().get("versioned_cache_ttl", 60))
+        with self.lock:
+            entry = self.entries.get((control_type, name))
+        return entry is None or time.time() - entry[1] > ttl
+
+    def invalidate(self, name):
+        """Expire the state of the file under all version controls."""
+
+        with self.lock:
+            for checker in self.checkers:
+                key = (checker.control_type, name)
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.entries[key] = (entry[0], 0)
+
+    def clear(self):
+        """Forget everything."""
+
+        with self.lock:
+            self.entries.clear()
+
+    def refresh(self, name):
+        """Check the state of the file in the background (entries that haven't expired are kept)."""
+
+        if name is None:
+            return
+        with self.lock:
+            if name in self.pending:
+                return
+            self.pending.add(name)
+        sublime.set_timeout_async(lambda: self.check(name), 0)
+
+    def check(self, name):
+        """Check the state of the file under each version control whose entry has expired (async thread)."""
+
+        try:
+            for checker in self.checkers:
+                if not self.expired(checker.control_type, name):
+                    continue
+                versioned = False
+                try:
+                    if checker.control_enabled is None:
+                        checker.check_vc()
+                    versioned = bool(checker.control_enabled) and checker.is_versioned(name)
+                except Exception as e:
+                    debug(e)
+                with self.lock:
+                    self.entries[(checker.control_type, name)] = (versioned, time.time())
+        finally:
+            with self.lock:
+                self.pending.discard(name)
+
+
+VERSIONED = VersionedCache()
+
+
+def debug_stats():
+    """Log the latency of the version control commands run so far."""
+
+    for name, (count, total, longest) in sorted(runner.get_stats().items()):
+        debug("%s: %d run(s), %.3fs average, %.3fs longest" % (name, count, total / count, longest))
+
+
+###############################
+# Revision Picker
+###############################
+class RevisionPicker(object):
+    """
+    Quick panel for picking a revision of the file to diff against.
+
+    History is loaded a page at a time; highlighting the last entry loads the next page.
+    The content of the highlighted revision is fetched in the background so that
+    it is ready by the time it is picked.
+    """
+
+    def __init__(self, command, name, kwargs):
+        """Initialize."""
+
+        self.command = command
+        self.window = command.window
+        self.name = name
+        self.kwargs = kwargs
+        self.records = []
+        self.complete = False
+        self.loading = False
+        self.highlighted = None
+
+    def start(self):
+        """Load the first page."""
+
+        self.load_page(0)
+
+    def load_page(self, selected):
+        """Load the next page in the background and show the panel."""
+
+        if self.loading or self.complete:
+            return
+        self.loading = True
+
+        def load():
+            """Fetch the page (async thread)."""
+
+            try:
+                records = self.command.get_history(self.name, len(self.records), HISTORY_PAGE_SIZE)
+            except Exception as e:
+                debug(e)
+                records = []
+            self.records.extend(records)
+            self.complete = len(records) < HISTORY_PAGE_SIZE
+            self.loading = False
+            sublime.set_timeout(lambda: self.show(selected), 0)
+
+        sublime.set_timeout_async(load, 0)
+
+    def show(self, selected=0):
+        """Show the panel (UI thread)."""
+
+        if not self.records:
+            notify("No History")
+            return
+
+        items = []
+        for record in self.records:
+            items.append(
+                [
+                    record.summary or "(no message)",
+                    "%s  %s  %s" % (
+                        record.node[:12], record.author, time.strftime("%Y-%m-%d %H:%M", time.localtime(record.date))
+                    )
+                ]
+            )
+        if not self.complete:
+            items.append(["More...", "Load older revisions"])
+        self.window.show_quick_panel(items, self.on_select, 0, min(selected, len(items) - 1), self.on_highlight)
+
+    def on_highlight(self, index):
+        """Load more history or prefetch the highlighted revision."""
+
+        if index == len(self.records):
+            self.load_page(index)
+        elif 0 <= index < len(self.records):
+            rev = self.records[index].node
+            self.highlighted = rev
+            sublime.set_timeout_async(lambda: self.prefetch(rev), PREFETCH_DELAY)
+
+    def prefetch(self, rev):
+        """Fetch the revision content if it is still highlighted (async thread)."""
+
+        if rev == self.highlighted:
+            try:
+                self.command.get_cached_revision(self.name, rev)
+            except Exception as e:
+                debug(e)
+
+    def on_select(self, index):
+        """Diff against the picked revision."""
+
+        if index == -1:
+            return
+        if index == len(self.records):
+            self.load_page(index)
+        else:
+            record = self.records[index]
+            self.command.revision_diff(self.name, record.node, record.node[:12], **self.kwargs)
+
 
 ###############################
 # Version Control Base
@@ -47,23 +258,64 @@ class _VersionControlDiff(object):
 
         return False
 
+    def get_base_token(self, name):
+        """Get a token that changes whenever the version control base of the file changes."""
+
+        return None
+
+    def get_cached_diff(self, name, **kwargs):
+        """Get the diff from the diff cache or from version control."""
+
+        key = None
+        try:
+            token = self.get_base_token(name)
+            if token is not None:
+                with open(name, "rb") as f:
+                    digest = hashlib.sha1(f.read()).hexdigest()
+                key = (self.control_type, name, digest, token, bool(kwargs.get("last", False)), self.encoding)
+        except Exception as e:
+            debug(e)
+
+        result = get_cached_diff(key) if key is not None else None
+        if result is None:
+            result = self.get_diff(name, **kwargs)
+            if key is not None and result is not None:
+                set_cached_diff(key, result, len(result))
+        return result
+
+    def get_base(self, name, **kwargs):
+        """Get the revision label and content of the file's version control base."""
+
+        return None
+
+    def get_cached_base(self, name, **kwargs):
+        """Get the base from the diff cache or from version control."""
+
+        key = None
+        try:
+            token = self.get_base_token(name)
+            if token is not None:
+                key = ("base", self.control_type, name, token, bool(kwargs.get("last", False)))
+        except Exception as e:
+            debug(e)
+
+        base = get_cached_diff(key) if key is not None else None
+        if base is None:
+            base = self.get_base(name, **kwargs)
+            if key is not None and base is not None:
+                set_cached_diff(key, base, len(base[1]))
+        return base
+
     def vc_is_enabled(self, name):
-        """Check if version control command is enabled."""
+        """Check if version control command is enabled (only cached states are used)."""
 
         enabled = False
         if name is not None:
-            try:
-                if self.control_enabled is None:
-                    self.check_vc()
-                enabled = (
-                    self.control_enabled and
-                    (
-                        multiget(load_settings(), "skip_version_check_on_is_enabled", False) or
-                        self.is_versioned(name)
-                    )
-                )
-            except Exception:
-                pass
+            versioned = VERSIONED.get(self.control_type, name)
+            if VERSIONED.expired(self.control_type, name):
+                # Keep using the old state until the check in the background replaces it.
+                VERSIONED.refresh(name)
+            enabled = bool(versioned)
         return enabled
 
     def decode(self, result):
@@ -114,29 +366,171 @@ class _VersionControlDiff(object):
                 sublime.error_message("Could not revert \"%s\"!" % basename(name))
 
     def internal_diff(self, name, **kwargs):
-        """Diff with internal diff."""
+        """Diff with internal diff in the background."""
 
-        result = self.get_diff(name, **kwargs)
+        win = sublime.active_window()
+        start_job(
+            (self.control_type, name),
+            lambda job: self.get_cached_diff(name, **kwargs),
+            lambda result: self.show_diff(win, name, result)
+        )
 
-        if result == "":
-            notify("No Difference")
-            result = None
+    def buffer_diff(self, name, base=None, **kwargs):
+        """
+        Diff the view's buffer (including unsaved changes) against the base with the internal diff engine.
 
-        if result is not None:
-            use_buffer = bool(load_settings().get("use_buffer", False))
+        `base` can be given as a function returning the revision label and content to diff against.
+        """
 
-            win = sublime.active_window()
-            if use_buffer:
-                v = win.new_file()
-                v.set_name("EasyDiff: %s (%s)" % (self.control_type, basename(name)))
-                v.set_scratch(True)
-                v.assign_syntax('Packages/Diff/Diff.tmLanguage')
-                v.run_command('append', {'characters': result})
-            else:
-                v = win.create_output_panel('easy_diff')
-                v.assign_syntax('Packages/Diff/Diff.tmLanguage')
-                v.run_command('append', {'characters': result})
-                win.run_command("show_panel", {"panel": "output.easy_diff"})
+        win = sublime.active_window()
+        view = self.view
+        diff_engine = load_settings().get("diff_engine", engine.DEFAULT_ENGINE)
+
+        def work(job):
+            """Get the base and diff it (async thread)."""
+
+            content = base() if base is not None else self.get_cached_base(name, **kwargs)
+            if content is None:
+                return False
+            job.check()
+            inputs = EasyDiffInput(EasyDiffView(name, self.decode(content[1]), view.encoding()), view)
+            inputs.f1 = "%s (%s)" % (name, content[0])
+            return EasyDiff.diff(inputs, diff_engine, job)
+
+        start_job((self.control_type, name), work, lambda result: self.show_buffer_diff(win, result))
+
+    def get_history(self, name, start, count):
+        """Get `count` log records of the file starting at index `start`."""
+
+        return []
+
+    def get_revision(self, name, rev):
+        """Get the content of the file at the revision."""
+
+        return None
+
+    def get_cached_revision(self, name, rev):
+        """Get the content of the file at the revision from the diff cache or from version control."""
+
+        key = ("revision", self.control_type, name, rev)
+        content = get_cached_diff(key)
+        if content is None:
+            content = self.get_revision(name, rev)
+            if content is not None:
+                set_cached_diff(key, content, len(content))
+        return content
+
+    def revision_diff(self, name, rev, label, **kwargs):
+        """Diff the file against the revision."""
+
+        def get_base():
+            """Get the revision content."""
+
+            content = self.get_cached_revision(name, rev)
+            return (label, content) if content is not None else None
+
+        if kwargs.get("external", False):
+            start_job(
+                (self.control_type, name),
+                lambda job: get_base(),
+                lambda result: self.external_revision_diff(name, rev, result)
+            )
+        else:
+            self.buffer_diff(name, get_base, **kwargs)
+
+    def external_revision_diff(self, name, rev, result):
+        """Write the revision to a temp file and open both files in the external diff tool (UI thread)."""
+
+        if result is None:
+            return
+        self.create_temp()
+        root, ext = splitext(basename(name))
+        for x in range(1000):
+            file_path = join(self.temp_folder, "%s-r%s-LEFT-%03d%s" % (root, rev, x, ext))
+            if not os.path.exists(file_path):
+                with open(file_path, "wb") as f:
+                    f.write(result[1])
+                subprocess.Popen([get_external_diff(), file_path, name])
+                break
+
+    def get_changes(self, name):
+        """Get the changed files of the repository the file belongs to."""
+
+        return []
+
+    def changes_diff(self, name):
+        """
+        Diff every changed file of the repository the file belongs to.
+
+        The changed files are found with one status call and their diffs are generated
+        in parallel.  Diffs are streamed into one result view in file order as they are ready.
+        """
+
+        win = self.window
+        title = "EasyDiff: %s (All Changes)" % self.control_type
+        renderer = EasyDiffRenderer(win, title, [])
+        workers = max(1, int(load_settings().get("vc_max_processes", 4)))
+
+        def get_file_diff(job, file_name):
+            """Get the diff of one file (worker thread)."""
+
+            job.check()
+            try:
+                return self.get_cached_diff(file_name)
+            except Exception as e:
+                log(e)
+                return None
+
+        def show(job, result):
+            """Append the diff of one file (UI thread)."""
+
+            if not job.cancelled and not renderer.extend(iter_lines(result.rstrip("\n"))):
+                job.cancel()
+
+        def work(job):
+            """Generate the diffs (async thread)."""
+
+            count = 0
+            files = self.get_changes(name)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(get_file_diff, job, f) for f in files]
+                try:
+                    for future in futures:
+                        result = future.result()
+                        job.check()
+                        if result:
+                            count += 1
+                            sublime.set_timeout(lambda r=result: show(job, r), 0)
+                finally:
+                    for future in futures:
+                        future.cancel()
+            return count
+
+        def done(count):
+            """Report when nothing changed (UI thread)."""
+
+            debug_stats()
+            if not count:
+                notify("No Difference")
+
+        start_job((self.control_type, "changes", win.id()), work, done)
+
+    def show_buffer_diff(self, win, result):
+        """Stream the buffer diff into the result view (UI thread)."""
+
+        debug_stats()
+        if result is not False:
+            EasyDiff.show(win, result)
+
+    def show_diff(self, win, name, result):
+        """Stream the diff into the result view (UI thread)."""
+
+        debug_stats()
+        if result == "":
+            notify("No Difference")
+        elif result is not None:
+            title = "EasyDiff: %s (%s)" % (self.control_type, basename(name))
+            EasyDiffRenderer(win, title, iter_lines(result)).render()
 
     def external_diff(self, name, **kwargs):
         """Diff with external diff command."""
@@ -175,9 +569,16 @@ class _VersionControlDiff(object):
         if name is not None:
             if self.kwargs.get("revert"):
                 self.revert(name)
+            elif self.kwargs.get("pick"):
+                RevisionPicker(self, name, self.kwargs).start()
+            elif self.kwargs.get("changes"):
+                self.changes_diff(name)
             else:
                 external = self.kwargs.get("external", False)
-                if not external:
+                buffer = self.kwargs.get("buffer", bool(load_settings().get("vc_diff_buffer", True)))
+                if not external and buffer and self.view is not None:
+                    self.buffer_diff(name, **self.kwargs)
+                elif not external:
                     self.internal_diff(name, **self.kwargs)
                 else:
                     self.external_diff(name, **self.kwargs)
@@ -259,6 +660,42 @@ class _EasyDiffSvn(_VersionControlDiff):
 
         svn.revert(name)
 
+    def get_base_token(self, name):
+        """Get the working copy state."""
+
+        return svn.get_wc_state(name)
+
+    def get_base(self, name, **kwargs):
+        """Get the `BASE` (or `PREV`) content."""
+
+        if not self.is_versioned(name):
+            log("View not versioned under SVN!", status=True)
+            return None
+        rev = "PREV" if kwargs.get("last", False) else "BASE"
+        try:
+            content = svn.cat(name, rev)
+        except Exception:
+            if rev != "BASE" or not svn.is_added(name):
+                raise
+            # Added files have no base yet.
+            content = b""
+        return rev, content
+
+    def get_changes(self, name):
+        """Get the changed files."""
+
+        return svn.get_changes(name)
+
+    def get_history(self, name, start, count):
+        """Get log records."""
+
+        return svn.get_history(name, start, count)
+
+    def get_revision(self, name, rev):
+        """Get the content of the file at the revision."""
+
+        return svn.cat(name, rev)
+
     def get_files(self, name, **kwargs):
         """Get files."""
 
@@ -278,7 +715,10 @@ class _EasyDiffSvn(_VersionControlDiff):
                     f1 = file_path
                     break
             if f1 is not None:
-                svn.export(f2, f1, rev=rev)
+                if rev == "BASE":
+                    svn.export_base(f2, f1)
+                else:
+                    svn.export(f2, f1, rev=rev)
         else:
             log("View not versioned under SVN!", status=True)
         return f1, f2
@@ -332,6 +772,43 @@ class _EasyDiffGit(_VersionControlDiff):
 
         git.checkout(name)
 
+    def get_base_token(self, name):
+        """Get the HEAD commit."""
+
+        return git.get_head(name)
+
+    def get_base(self, name, **kwargs):
+        """Get the `HEAD` (or previous revision) content."""
+
+        if not self.is_versioned(name):
+            log("View not versioned under Git!", status=True)
+            return None
+        rev = "HEAD"
+        if kwargs.get("last", False):
+            revs = git.getrevision(name, 2)
+            if revs is None or len(revs) != 2:
+                log("No previous revision to diff against!", status=True)
+                return None
+            rev = revs[1]
+        bfr = git.show(name, rev)
+        # Files added since the revision have no content there.
+        return rev, bfr if bfr is not None else b""
+
+    def get_changes(self, name):
+        """Get the changed files."""
+
+        return git.get_changes(name)
+
+    def get_history(self, name, start, count):
+        """Get log records."""
+
+        return git.get_history(name, start, count)
+
+    def get_revision(self, name, rev):
+        """Get the content of the file at the revision."""
+
+        return git.show(name, rev)
+
     def get_files(self, name, **kwargs):
         """Get files."""
 
@@ -376,6 +853,9 @@ class _EasyDiffGit(_VersionControlDiff):
 
         result = None
         if git.is_versioned(name):
+            if not kwargs.get("last", False) and not git.is_dirty(name):
+                # Nothing changed since `HEAD`.
+                return ""
             result = self.decode(
                 git.diff(
                     name,
@@ -418,6 +898,48 @@ class _EasyDiffHg(_VersionControlDiff):
 
         hg.revert(name)
 
+    def get_base_token(self, name):
+        """Get the working directory parent."""
+
+        return hg.get_parent(name)
+
+    def get_base(self, name, **kwargs):
+        """Get the working directory parent (or previous revision) content."""
+
+        if not self.is_versioned(name):
+            log("View not versioned under Mercurial!", status=True)
+            return None
+        rev = None
+        if kwargs.get("last", False):
+            revs = hg.getrevision(name, 2)
+            if len(revs) != 2:
+                log("No previous revision to diff against!", status=True)
+                return None
+            rev = revs[1]
+        try:
+            content = hg.cat(name, rev)
+        except Exception:
+            if rev is not None or not hg.is_added(name):
+                raise
+            # Added files have no content in the working directory parent.
+            content = b""
+        return rev if rev is not None else ".", content
+
+    def get_changes(self, name):
+        """Get the changed files."""
+
+        return hg.get_changes(name)
+
+    def get_history(self, name, start, count):
+        """Get log records."""
+
+        return hg.get_history(name, start, count)
+
+    def get_revision(self, name, rev):
+        """Get the content of the file at the revision."""
+
+        return hg.cat(name, rev)
+
     def get_files(self, name, **kwargs):
         """Get the files."""
 
@@ -502,6 +1024,31 @@ class EasyDiffHgCommand(_VersionControlCommand, _EasyDiffHg):
         self.setup()
 
 
+###############################
+# Listener
+###############################
+class EasyDiffVersionControlListener(sublime_plugin.EventListener):
+    """Keep the versioned state cache up to date."""
+
+    def on_activated_async(self, view):
+        """Check the file when its view is activated."""
+
+        VERSIONED.refresh(view.file_name())
+
+    def on_load_async(self, view):
+        """Check the file when it is loaded."""
+
+        VERSIONED.refresh(view.file_name())
+
+    def on_post_save_async(self, view):
+        """Check the file again when it is saved."""
+
+        name = view.file_name()
+        if name is not None:
+            VERSIONED.invalidate(name)
+            VERSIONED.refresh(name)
+
+
 ###############################
 # Loaders
 ###############################
@@ -526,6 +1073,14 @@ def setup_vc_binaries():
         hg.set_hg_path(hg_path)
         HG_ENABLED = None
 
+    runner.configure(int(settings.get("vc_timeout", 60)), int(settings.get("vc_max_processes", 4)))
+    timeout = int(settings.get("vc_server_idle_timeout", 60))
+    git.set_batch_timeout(timeout)
+    git.set_read_objects(bool(settings.get("git_read_objects", True)))
+    hg.set_command_server(bool(settings.get("hg_command_server", True)), timeout)
+    svn.set_wc_db(bool(settings.get("svn_read_wc_db", True)))
+    VERSIONED.clear()
+
     settings.clear_on_change('reload_vc')
     settings.add_on_change('reload_vc', setup_vc_binaries)
 
@@ -533,4 +1088,15 @@ def setup_vc_binaries():
 def plugin_loaded():
     """Setup plugin."""
 
+    VERSIONED.checkers = []
+    for checker in (_EasyDiffSvn(), _EasyDiffGit(), _EasyDiffHg()):
+        checker.setup()
+        VERSIONED.checkers.append(checker)
     setup_vc_binaries()
+
+
+def plugin_unloaded():
+    """Tear down plugin."""
+
+    git.stop_cat_file_servers()
+    hg.stop_command_servers()
@@ -0,0 +1,125 @@
+"""
+Cache.
+
+Copyright (c) 2013 - 2015 Isaac Muse <isaacmuse@gmail.com>
+License: MIT
+"""
+from collections import OrderedDict
+import threading
+
+
+class LRUCache(object):
+    """
+    Least recently used cache with a size cap.
+
+    Each entry is stored with a size (in bytes or any other unit), and the least
+    recently used entries are evicted once the total size exceeds the cap.
+    """
+
+    def __init__(self, max_size=0):
+        """Initialize."""
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Get the entry and mark it as recently used."""
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size=1):
+        """Store an entry and evict old entries if needed."""
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            if size > self.max_size:
+                return
+            self.entries[key] = (value, size)
+            self.size += size
+            self._evict()
+
+    def discard(self, key):
+        """Remove an entry."""
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+
+    def resize(self, max_size):
+        """Set the size cap."""
+
+        with self.lock:
+            self.max_size = max_size
+            self._evict()
+
+    def clear(self):
+        """Clear the cache."""
+
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _evict(self):
+        """Evict the least recently used entries until we are under the cap."""
+
+        while self.size > self.max_size and self.entries:
+            value, size = self.entries.popitem(last=False)[1]
+            self.size -= size
+
+    def stats(self):
+        """Get a status string."""
+
+        return "hits: %d, misses: %d, entries: %d, size: %d" % (self.hits, self.misses, len(self.entries), self.size)
+
+
+class HistoryCache(object):
+    """
+    Revision history of files, fetched in pages.
+
+    Histories are keyed by the file and a token of the repository's head (so they
+    are dropped when new commits come in), and are only fetched as far back as
+    they have been asked for.
+    """
+
+    def __init__(self, max_size=0):
+        """Initialize."""
+
+        self.cache = LRUCache(max_size)
+
+    def get(self, key, start, count, fetch):
+        """
+        Get `count` records starting at index `start`.
+
+        If the history isn't known that far back, `fetch(records, count)` is called with
+        the records known so far and must return up to `count` older records.
+        """
+
+        entry = self.cache.get(key)
+        records, complete = entry if entry is not None else ([], False)
+        end = start + count
+        if not complete and len(records) < end:
+            wanted = end - len(records)
+            older = fetch(records, wanted)
+            records = records + list(older)
+            complete = len(older) < wanted
+            self.cache.put(key, (records, complete), max(len(records), 1))
+        return records[start:end]
+
+    def clear(self):
+        """Clear the cache."""
+
+        self.cache.clear()
@@ -0,0 +1,612 @@
+"""
+Diff engines.
+
+Copyright (c) 2013 - 2015 Isaac Muse <isaacmuse@gmail.com>
+License: MIT
+"""
+import difflib
+import re
+from array import array
+from bisect import bisect_left
+
+DEFAULT_ENGINE = "difflib"
+
+# Lines that occur more often than this in a region are not used as anchors by the histogram engine.
+MAX_CHAIN = 64
+
+# Regions without usable anchors fall back to `difflib` if they are smaller than this (lines * lines).
+FALLBACK_LIMIT = 250000
+
+# Larger regions without usable anchors are matched with Myers' algorithm if they differ by at most this many lines.
+MYERS_LIMIT = 2000
+
+# Changed word runs up to this many characters are refined to character level.
+CHAR_LIMIT = 64
+
+RE_WORD = re.compile(r'\w+|\s+|[^\w\s]')
+
+ENGINES = {}
+
+
+class LineTable(object):
+    """
+    Intern lines as integer IDs.
+
+    Both sides of a compare share one table so that equal lines get equal IDs
+    and the engines only ever compare integers.
+    """
+
+    def __init__(self):
+        """Initialize."""
+
+        self.ids = {}
+        self.lines = []
+
+    def intern(self, lines):
+        """Intern the lines and return a compact buffer of their IDs."""
+
+        ids = self.ids
+        table = self.lines
+        buf = array('i')
+        for line in lines:
+            idx = ids.get(line)
+            if idx is None:
+                idx = len(table)
+                ids[line] = idx
+                table.append(line)
+            buf.append(idx)
+        return buf
+
+
+def register_engine(name, engine):
+    """
+    Register a diff engine.
+
+    An engine is a callable that takes two sequences and returns the matching blocks
+    in the same form as `difflib.SequenceMatcher.get_matching_blocks`.
+    """
+
+    ENGINES[name] = engine
+
+
+def get_engine(name):
+    """Get the engine by name, falling back to the default engine."""
+
+    return ENGINES.get(name, ENGINES[DEFAULT_ENGINE])
+
+
+def difflib_blocks(a, b):
+    """Get matching blocks with `difflib`."""
+
+    return difflib.SequenceMatcher(None, a, b).get_matching_blocks()
+
+
+def _myers_blocks(a, b, alo, ahi, blo, bhi, limit=MYERS_LIMIT):
+    """
+    Match a region with Myers' O(ND) algorithm.
+
+    Return `None` if the region needs more than `limit` inserted and deleted lines.
+    """
+
+    n = ahi - alo
+    m = bhi - blo
+    max_d = min(n + m, limit)
+    off = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace = []
+    found = False
+    for d in range(max_d + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[off + k - 1] < v[off + k + 1]):
+                x = v[off + k + 1]
+            else:
+                x = v[off + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            v[off + k] = x
+            if x >= n and y >= m:
+                found = True
+                break
+        trace.append(v[off - d:off + d + 1])
+        if found:
+            break
+    if not found:
+        return None
+
+    # Walk the furthest reaching paths back from the end to collect the snakes.
+    blocks = []
+    x, y = n, m
+    for d in range(len(trace) - 1, 0, -1):
+        prev = trace[d - 1]
+        k = x - y
+        if k == -d or (k != d and prev[k - 1 + d - 1] < prev[k + 1 + d - 1]):
+            prev_k = k + 1
+            prev_x = prev[prev_k + d - 1]
+            mid_x = prev_x
+        else:
+            prev_k = k - 1
+            prev_x = prev[prev_k + d - 1]
+            mid_x = prev_x + 1
+        if x > mid_x:
+            blocks.append((alo + mid_x, blo + mid_x - k, x - mid_x))
+        x, y = prev_x, prev_x - prev_k
+    if x:
+        blocks.append((alo, blo, x))
+    return blocks
+
+
+def _fallback_blocks(a, b, alo, ahi, blo, bhi):
+    """
+    Match a region with no anchors.
+
+    Small regions use `difflib`, larger ones Myers' algorithm.  Only regions that differ
+    too much for either are reported as one replaced block.
+    """
+
+    blocks = []
+    if (ahi - alo) * (bhi - blo) <= FALLBACK_LIMIT:
+        sm = difflib.SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+        for i, j, size in sm.get_matching_blocks():
+            if size:
+                blocks.append((alo + i, blo + j, size))
+    else:
+        blocks = _myers_blocks(a, b, alo, ahi, blo, bhi) or []
+    return blocks
+
+
+def _histogram_anchor(a, b, alo, ahi, blo, bhi):
+    """Find the longest common run that contains the least frequent lines of the region."""
+
+    index = {}
+    for i in range(alo, ahi):
+        line = a[i]
+        if line in index:
+            index[line].append(i)
+        else:
+            index[line] = [i]
+
+    best = None
+    best_count = MAX_CHAIN + 1
+    best_size = 0
+    j = blo
+    while j < bhi:
+        positions = index.get(b[j])
+        next_j = j + 1
+        if positions is None or len(positions) > best_count:
+            j = next_j
+            continue
+
+        for i in positions:
+            si, sj = i, j
+            count = len(positions)
+            while si > alo and sj > blo and a[si - 1] == b[sj - 1]:
+                si -= 1
+                sj -= 1
+                c = len(index[a[si]])
+                if c < count:
+                    count = c
+            ei, ej = i + 1, j + 1
+            while ei < ahi and ej < bhi and a[ei] == b[ej]:
+                c = len(index[a[ei]])
+                if c < count:
+                    count = c
+                ei += 1
+                ej += 1
+            if ej > next_j:
+                next_j = ej
+            size = ei - si
+            if count < best_count or (count == best_count and size > best_size):
+                best = [(si, sj, size)]
+                best_count = count
+                best_size = size
+        j = next_j
+
+    return best
+
+
+def _patience_anchors(a, b, alo, ahi, blo, bhi):
+    """Find the longest increasing run of lines that are unique on both sides."""
+
+    counts = {}
+    for i in range(alo, ahi):
+        line = a[i]
+        entry = counts.get(line)
+        counts[line] = [i, -1, 1, 0] if entry is None else [entry[0], -1, entry[2] + 1, 0]
+    for j in range(blo, bhi):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[1] = j
+            entry[3] += 1
+
+    unique = sorted((e[0], e[1]) for e in counts.values() if e[2] == 1 and e[3] == 1)
+    if not unique:
+        return None
+
+    # Patience sort to find the longest increasing subsequence of B positions.
+    tails = []
+    tail_index = []
+    back = [-1] * len(unique)
+    for idx, (i, j) in enumerate(unique):
+        pos = bisect_left(tails, j)
+        if pos:
+            back[idx] = tail_index[pos - 1]
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(idx)
+        else:
+            tails[pos] = j
+            tail_index[pos] = idx
+
+    anchors = []
+    idx = tail_index[-1]
+    while idx != -1:
+        i, j = unique[idx]
+        anchors.append((i, j, 1))
+        idx = back[idx]
+    anchors.reverse()
+    return anchors
+
+
+def _recursive_blocks(a, b, find_anchors):
+    """Split the sequences on anchors and match the regions in between."""
+
+    blocks = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+
+        # Strip common head and tail of the region.
+        size = 0
+        while alo + size < ahi and blo + size < bhi and a[alo + size] == b[blo + size]:
+            size += 1
+        if size:
+            blocks.append((alo, blo, size))
+            alo += size
+            blo += size
+        size = 0
+        while alo < ahi - size and blo < bhi - size and a[ahi - size - 1] == b[bhi - size - 1]:
+            size += 1
+        if size:
+            ahi -= size
+            bhi -= size
+            blocks.append((ahi, bhi, size))
+        if alo >= ahi or blo >= bhi:
+            continue
+
+        anchors = find_anchors(a, b, alo, ahi, blo, bhi)
+        if not anchors:
+            blocks.extend(_fallback_blocks(a, b, alo, ahi, blo, bhi))
+            continue
+
+        i, j = alo, blo
+        for ai, bj, size in anchors:
+            stack.append((i, ai, j, bj))
+            blocks.append((ai, bj, size))
+            i, j = ai + size, bj + size
+        stack.append((i, ahi, j, bhi))
+
+    return merge_blocks(blocks, len(a), len(b))
+
+
+def merge_blocks(blocks, la, lb):
+    """Sort and join adjacent matching blocks and append the terminating sentinel."""
+
+    merged = []
+    for i, j, size in sorted(blocks):
+        if merged:
+            pi, pj, psize = merged[-1]
+            if pi + psize == i and pj + psize == j:
+                merged[-1] = (pi, pj, psize + size)
+                continue
+        merged.append((i, j, size))
+    merged.append((la, lb, 0))
+    return merged
+
+
+def histogram_blocks(a, b):
+    """Get matching blocks with the histogram algorithm."""
+
+    return _recursive_blocks(a, b, _histogram_anchor)
+
+
+def patience_blocks(a, b):
+    """Get matching blocks with the patience algorithm."""
+
+    return _recursive_blocks(a, b, _patience_anchors)
+
+
+def blocks_to_opcodes(blocks):
+    """Convert matching blocks to opcodes."""
+
+    i = j = 0
+    opcodes = []
+    for ai, bj, size in blocks:
+        tag = ''
+        if i < ai and j < bj:
+            tag = 'replace'
+        elif i < ai:
+            tag = 'delete'
+        elif j < bj:
+            tag = 'insert'
+        if tag:
+            opcodes.append((tag, i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            opcodes.append(('equal', ai, i, bj, j))
+    return opcodes
+
+
+def common_prefix(a, b):
+    """Get the length of the common prefix (compares slices so the work is done in C)."""
+
+    lo = 0
+    hi = min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def common_suffix(a, b, prefix=0):
+    """Get the length of the common suffix that does not overlap the prefix."""
+
+    la = len(a)
+    lb = len(b)
+    lo = 0
+    hi = min(la, lb) - prefix
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[la - mid:la - lo] == b[lb - mid:lb - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def get_opcodes(a, b, engine=DEFAULT_ENGINE):
+    """
+    Get the opcodes to turn `a` into `b` using the given engine.
+
+    The common head and tail are trimmed first so the engine only sees the region that changed.
+    """
+
+    la = len(a)
+    lb = len(b)
+    head = common_prefix(a, b)
+    tail = common_suffix(a, b, head)
+
+    blocks = []
+    if head:
+        blocks.append((0, 0, head))
+    if head < la - tail and head < lb - tail:
+        for i, j, size in get_engine(engine)(a[head:la - tail], b[head:lb - tail]):
+            if size:
+                blocks.append((head + i, head + j, size))
+    if tail:
+        blocks.append((la - tail, lb - tail, tail))
+
+    return blocks_to_opcodes(merge_blocks(blocks, la, lb))
+
+
+def update_opcodes(opcodes, a, b, side, start, old_end, new_end, engine=DEFAULT_ENGINE):
+    """
+    Update opcodes after lines `[start, old_end)` of one side were replaced by lines `[start, new_end)`.
+
+    `a` and `b` are the sequences after the edit and `side` is `0` if `a` was edited
+    or `1` if `b` was edited.  Only the changes around the edit are diffed again;
+    the rest of the previous alignment is reused.
+    """
+
+    # Work in the coordinates of the edited side (`x`) and the other side (`y`).
+    codes = [(tag, i1, i2, j1, j2) if side == 0 else (tag, j1, j2, i1, i2) for tag, i1, i2, j1, j2 in opcodes]
+
+    # Find the start of the region on both sides.
+    lo = (start, start)
+    for tag, x1, x2, y1, y2 in codes:
+        if x1 <= start < x2 or (start == x2 == x1):
+            lo = (start, y1 + start - x1) if tag == 'equal' else (x1, y1)
+            break
+    else:
+        if codes:
+            lo = (codes[-1][2], codes[-1][4])
+
+    # Find the end of the region on both sides.
+    hi = lo
+    if old_end > lo[0]:
+        for tag, x1, x2, y1, y2 in codes:
+            if x1 < old_end <= x2:
+                hi = (old_end, y1 + old_end - x1) if tag == 'equal' else (x2, y2)
+                break
+    # Pure insertions or deletions of the other side next to the edit are part of the region.
+    for tag, x1, x2, y1, y2 in codes:
+        if tag != 'equal' and x1 == x2 and x1 == hi[0] and y1 == hi[1]:
+            hi = (x2, y2)
+    delta = new_end - old_end
+
+    blocks = []
+    for tag, x1, x2, y1, y2 in codes:
+        if tag != 'equal':
+            continue
+        # Keep the parts of equal blocks outside the region, shifting those after it.
+        if x1 < lo[0]:
+            size = min(x2, lo[0]) - x1
+            blocks.append((x1, y1, size))
+        if x2 > hi[0]:
+            offset = max(x1, hi[0]) - x1
+            blocks.append((x1 + offset + delta, y1 + offset, x2 - x1 - offset))
+
+    x = a if side == 0 else b
+    y = b if side == 0 else a
+    for i, j, size in get_engine(engine)(x[lo[0]:hi[0] + delta], y[lo[1]:hi[1]]):
+        if size:
+            blocks.append((lo[0] + i, lo[1] + j, size))
+
+    if side == 1:
+        blocks = [(j, i, size) for i, j, size in blocks]
+    return blocks_to_opcodes(merge_blocks(blocks, len(a), len(b)))
+
+
+def _spans(tokens, i1, i2, offsets):
+    """Get the character span of a run of tokens."""
+
+    start = offsets[i1]
+    end = offsets[i2 - 1] + len(tokens[i2 - 1])
+    return start, end
+
+
+def intraline_spans(a, b, budget=100000):
+    """
+    Get the changed character spans within a pair of lines.
+
+    The lines are diffed by words, and small changed word runs are refined by
+    characters.  If the work would exceed `budget`, `None` is returned.
+    """
+
+    if len(a) + len(b) > budget:
+        return None
+
+    ta = []
+    oa = []
+    for m in RE_WORD.finditer(a):
+        ta.append(m.group(0))
+        oa.append(m.start(0))
+    tb = []
+    ob = []
+    for m in RE_WORD.finditer(b):
+        tb.append(m.group(0))
+        ob.append(m.start(0))
+    if len(ta) * len(tb) > budget:
+        return None
+
+    spans_a = []
+    spans_b = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, ta, tb, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            continue
+        sa = _spans(ta, i1, i2, oa) if i1 < i2 else None
+        sb = _spans(tb, j1, j2, ob) if j1 < j2 else None
+        if (
+            tag == 'replace' and
+            (sa[1] - sa[0]) + (sb[1] - sb[0]) <= CHAR_LIMIT
+        ):
+            sm = difflib.SequenceMatcher(None, a[sa[0]:sa[1]], b[sb[0]:sb[1]], autojunk=False)
+            for ctag, c1, c2, d1, d2 in sm.get_opcodes():
+                if ctag == 'equal':
+                    continue
+                if c1 < c2:
+                    spans_a.append((sa[0] + c1, sa[0] + c2))
+                if d1 < d2:
+                    spans_b.append((sb[0] + d1, sb[0] + d2))
+            continue
+        if sa is not None:
+            spans_a.append(sa)
+        if sb is not None:
+            spans_b.append(sb)
+    return spans_a, spans_b
+
+
+def group_opcodes(codes, n=3):
+    """Isolate change clusters with up to `n` lines of context."""
+
+    codes = list(codes)
+    if not codes:
+        codes = [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    nn = n + n
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == 'equal' and i2 - i1 > nn:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+
+def format_range(start, stop):
+    """Convert a range to the unified diff format."""
+
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return '%d' % beginning
+    if not length:
+        beginning -= 1
+    return '%d,%d' % (beginning, length)
+
+
+class _LineView(object):
+    """Resolve slices of line IDs to their text."""
+
+    def __init__(self, ids, lines):
+        """Initialize."""
+
+        self.ids = ids
+        self.lines = lines
+
+    def __getitem__(self, index):
+        """Get the text for a slice of IDs."""
+
+        lines = self.lines
+        return [lines[x] for x in self.ids[index]]
+
+
+def unified_diff(
+    a, b, fromfile='', tofile='', fromfiledate='', tofiledate='', n=3, lineterm='\n', engine=DEFAULT_ENGINE,
+    lines=None, opcodes=None
+):
+    """
+    Generate a unified diff with the given engine (same output format as `difflib.unified_diff`).
+
+    If `lines` is given, `a` and `b` are sequences of line IDs (see `LineTable`)
+    and the text is only looked up when the hunks are rendered.  If `opcodes`
+    is given, they are used instead of running the engine.
+    """
+
+    if opcodes is None:
+        opcodes = get_opcodes(a, b, engine)
+
+    text_a = a if lines is None else _LineView(a, lines)
+    text_b = b if lines is None else _LineView(b, lines)
+
+    started = False
+    for group in group_opcodes(opcodes, n):
+        if not started:
+            started = True
+            fromdate = '\t%s' % fromfiledate if fromfiledate else ''
+            todate = '\t%s' % tofiledate if tofiledate else ''
+            yield '--- %s%s%s' % (fromfile, fromdate, lineterm)
+            yield '+++ %s%s%s' % (tofile, todate, lineterm)
+
+        first, last = group[0], group[-1]
+        yield '@@ -%s +%s @@%s' % (format_range(first[1], last[2]), format_range(first[3], last[4]), lineterm)
+
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in text_a[i1:i2]:
+                    yield ' ' + line
+                continue
+            if tag in ('replace', 'delete'):
+                for line in text_a[i1:i2]:
+                    yield '-' + line
+            if tag in ('replace', 'insert'):
+                for line in text_b[j1:j2]:
+                    yield '+' + line
+
+
+register_engine("difflib", difflib_blocks)
+register_engine("histogram", histogram_blocks)
+register_engine("patience", patience_blocks)
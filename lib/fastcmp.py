@@ -0,0 +1,138 @@
+"""
+Fast file compare.
+
+Copyright (c) 2013 - 2015 Isaac Muse <isaacmuse@gmail.com>
+License: MIT
+"""
+import codecs
+import mmap
+import os
+
+IDENTICAL = 0
+DIFFERENT = 1
+BINARY = 2
+
+CHUNK_SIZE = 1024 * 1024
+
+# Number of bytes at the start of a file used to detect its encoding.
+ENCODING_SAMPLE = 65536
+
+# Byte order marks (UTF-32 first as its little endian mark starts with UTF-16's).
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf_32"),
+    (codecs.BOM_UTF32_BE, "utf_32"),
+    (codecs.BOM_UTF8, "utf_8_sig"),
+    (codecs.BOM_UTF16_LE, "utf_16"),
+    (codecs.BOM_UTF16_BE, "utf_16")
+)
+
+
+class _MappedFile(object):
+    """Memory map a file (empty files are mapped to an empty byte string)."""
+
+    def __init__(self, path):
+        """Initialize."""
+
+        self.path = path
+        self.file = None
+        self.map = b""
+
+    def __enter__(self):
+        """Open and map the file."""
+
+        self.file = open(self.path, "rb")
+        if os.fstat(self.file.fileno()).st_size:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map
+
+    def __exit__(self, *args):
+        """Unmap and close the file."""
+
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
+
+
+def get_bom_encoding(buf):
+    """Get the encoding given by the byte order mark at the start of the buffer (`None` if there isn't one)."""
+
+    start = buf[:4]
+    for bom, encoding in BOMS:
+        if start.startswith(bom):
+            return encoding
+    return None
+
+
+def _decodes(buf, encoding, final):
+    """Check if the buffer decodes with the encoding."""
+
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(buf, final=final)
+    except (LookupError, UnicodeDecodeError):
+        return False
+    return True
+
+
+def detect_encoding(path, default="utf_8", fallback="cp1252"):
+    """
+    Detect the encoding of a file.
+
+    A byte order mark decides the encoding.  Otherwise the start of the file is tried
+    as UTF-8, then with the default encoding, and the fallback encoding is used if neither fits.
+    """
+
+    with _MappedFile(path) as buf:
+        encoding = get_bom_encoding(buf)
+        if encoding is None:
+            sample = buf[:ENCODING_SAMPLE]
+            final = len(buf) <= ENCODING_SAMPLE
+            for encoding in ("utf_8", default):
+                if _decodes(sample, encoding, final):
+                    break
+            else:
+                encoding = fallback
+    return encoding
+
+
+def _is_binary(buf, encoding):
+    """
+    Check for NUL bytes.
+
+    UTF-16 and UTF-32 text (known by its byte order mark or the encoding) is expected to contain NUL bytes.
+    """
+
+    encoding = get_bom_encoding(buf) or encoding
+    wide = encoding.lower().replace('-', '_').startswith(('utf_16', 'utf_32'))
+    return not wide and buf.find(b"\x00") != -1
+
+
+def is_binary(path, encoding="utf-8"):
+    """Check if the file looks binary (contains NUL bytes that are not part of UTF-16 or UTF-32 text)."""
+
+    with _MappedFile(path) as buf:
+        return _is_binary(buf, encoding)
+
+
+def compare_files(path1, path2, encoding1="utf-8", encoding2="utf-8"):
+    """
+    Compare two files on disk without reading them into memory.
+
+    Return `IDENTICAL` if the content is the same, `BINARY` if either file looks binary,
+    and `DIFFERENT` if a text diff is needed.
+    """
+
+    with _MappedFile(path1) as buf1, _MappedFile(path2) as buf2:
+        size = len(buf1)
+        if size == len(buf2):
+            identical = True
+            for start in range(0, size, CHUNK_SIZE):
+                if buf1[start:start + CHUNK_SIZE] != buf2[start:start + CHUNK_SIZE]:
+                    identical = False
+                    break
+            if identical:
+                return IDENTICAL
+
+        if _is_binary(buf1, encoding1) or _is_binary(buf2, encoding2):
+            return BINARY
+
+    return DIFFERENT
@@ -5,10 +5,18 @@ Copyright (c) 2013 - 2015 Isaac Muse <isaacmuse@gmail.com>
 License: MIT
 """
 # `import xml.etree.ElementTree as ET`
+from collections import namedtuple
 import os
 import re
 import subprocess
 import sys
+import threading
+import time
+from . import vcroot
+from . import gitobjects
+from . import runner
+from . import tools
+from .cache import HistoryCache
 
 if sys.platform.startswith('win'):
     _PLATFORM = "windows"
@@ -19,6 +27,30 @@ else:
 
 _git_path = "git.exe" if _PLATFORM == "windows" else "git"
 
+# Seconds a `cat-file` server can sit unused before it is shut down.
+_batch_timeout = 60
+
+_batch_lock = threading.Lock()
+_batch_servers = {}
+
+# Read HEAD content straight from the object database when possible.
+_read_objects = True
+
+_status_lock = threading.Lock()
+_status_snapshots = {}
+
+# Number of log records kept in the history cache.
+HISTORY_CACHE_SIZE = 100000
+
+_history = HistoryCache(HISTORY_CACHE_SIZE)
+
+LogEntry = namedtuple("LogEntry", ["node", "date", "author", "summary"])
+
+TRACKED = 0
+MODIFIED = 1
+UNTRACKED = 2
+IGNORED = 3
+
 # ```
 # UNSTAGED_DIFF = 0
 # STAGED_DIFF = 1
@@ -29,95 +61,230 @@ _git_path = "git.exe" if _PLATFORM == "windows" else "git"
 def which():
     """See if executable exists."""
 
-    location = None
-    if os.path.basename(_git_path) != _git_path:
-        if os.path.isfile(_git_path):
-            location = _git_path
-    else:
-        paths = [x for x in os.environ["PATH"].split(os.pathsep) if not x.isspace()]
-        for path in paths:
-            exe = os.path.join(path, _git_path)
-            if os.path.isfile(exe):
-                location = exe
-                break
-    return location
-
-
-def is_system_root(target):
-    """Check if target is the root folder."""
-
-    root = False
-    windows = _PLATFORM == "windows"
-    if windows and re.match(r"^[A-Za-z]{1}:\\$", target) is not None:
-        root = True
-    elif not windows and target == '/':
-        root = True
-
-    return root
+    return tools.which(_git_path)
 
 
 def get_git_tree(target):
-    """Recursively get Git tree."""
+    """Get Git tree."""
 
-    root = is_system_root(target)
-    is_file = os.path.isfile(target)
-    folder = os.path.dirname(target) if is_file else target
-    if os.path.exists(os.path.join(folder, ".git")):
-        return folder
-    else:
-        if root:
-            return None
-        else:
-            return get_git_tree(os.path.dirname(folder))
+    return vcroot.find_root(target, vcroot.GIT)
 
 
 def get_git_dir(tree):
     """Get Git directory from tree."""
 
-    return os.path.join(tree, ".git")
+    return vcroot.get_git_dir(tree)
 
 
-def gitopen(args, git_tree=None):
-    """Call Git with arguments."""
+def get_head(target):
+    """Get the commit HEAD points to by reading the Git directory directly."""
 
-    returncode = None
-    output = None
+    git_tree = get_git_tree(target)
+    if git_tree is None:
+        return None
+
+    git_dir = get_git_dir(git_tree)
+    with open(os.path.join(git_dir, "HEAD"), "r") as f:
+        head = f.read().strip()
+
+    if not head.startswith("ref: "):
+        return head
+
+    # Worktrees keep their own `HEAD`, but share the refs of the main repository.
+    git_dir = vcroot.get_git_common_dir(git_dir)
+    ref = head[5:]
+    ref_file = os.path.join(git_dir, *ref.split('/'))
+    if os.path.isfile(ref_file):
+        with open(ref_file, "r") as f:
+            return f.read().strip()
+
+    packed = os.path.join(git_dir, "packed-refs")
+    if os.path.isfile(packed):
+        with open(packed, "r") as f:
+            for line in f:
+                parts = line.strip().split(" ")
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    return None
+
+
+class CatFileServer(object):
+    """
+    Long running `git cat-file --batch` (or `--batch-check`) process.
+
+    Requests are written to the process' stdin and the object info (and content)
+    is read back from stdout, so only one process is started per repository.
+    The process is restarted if it dies, and shut down after it has not been
+    used for `_batch_timeout` seconds.
+    """
+
+    def __init__(self, git_tree, check=False):
+        """Initialize."""
+
+        self.git_tree = git_tree
+        self.check = check
+        self.lock = threading.Lock()
+        self.process = None
+        self.timer = None
+
+    def start(self):
+        """Start the process."""
+
+        cmd = [
+            _git_path, "--work-tree=%s" % self.git_tree, "--git-dir=%s" % get_git_dir(self.git_tree),
+            "cat-file", "--batch-check" if self.check else "--batch"
+        ]
+        self.process = runner.popen(cmd, stderr=subprocess.DEVNULL)
+
+    def stop(self):
+        """Stop the process."""
+
+        with self.lock:
+            self._stop()
+
+    def _stop(self):
+        """Stop the process (lock must be held)."""
+
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.process is not None:
+            process = self.process
+            self.process = None
+            try:
+                process.stdin.close()
+            except Exception:
+                pass
+            try:
+                process.wait(1)
+            except Exception:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+    def _idle(self, timer):
+        """Shut down the process when it hasn't been used in a while."""
+
+        with self.lock:
+            # Ignore timers that were replaced by a newer request.
+            if timer is self.timer:
+                self.timer = None
+                self._stop()
+
+    def kill(self):
+        """Kill the process (used when a request takes too long)."""
+
+        process = self.process
+        if process is not None:
+            process.kill()
+
+    def _request(self, obj):
+        """Send a request and read the response (the process is killed if it doesn't reply in time)."""
+
+        with runner.request("git cat-file", self.kill):
+            return self._communicate(obj)
+
+    def _communicate(self, obj):
+        """Send a request and read the response."""
+
+        if self.process is None or self.process.poll() is not None:
+            self._stop()
+            self.start()
+
+        self.process.stdin.write(obj.encode("utf-8") + b"\n")
+        self.process.stdin.flush()
+        header = self.process.stdout.readline()
+        if not header.endswith(b"\n"):
+            raise IOError("cat-file server closed unexpectedly")
+
+        header = header.rstrip(b"\n")
+        if header.endswith((b" missing", b" ambiguous")):
+            # The object name is echoed back and can contain spaces.
+            return None
+
+        parts = header.split(b" ")
+        if len(parts) != 3 or gitobjects.RE_SHA.match(parts[0].decode("utf-8", "replace")) is None:
+            raise IOError("cat-file server sent an unexpected response")
+
+        sha, kind, size = parts[0].decode("utf-8"), parts[1].decode("utf-8"), int(parts[2])
+        content = None
+        if not self.check:
+            content = self.process.stdout.read(size + 1)
+            if len(content) != size + 1:
+                raise IOError("cat-file server closed unexpectedly")
+            content = content[:-1]
+        return sha, kind, size, content
+
+    def request(self, obj):
+        """
+        Look up an object (`rev:path`, sha, etc.).
+
+        Return `(sha, type, size, content)` (content is `None` for `--batch-check`),
+        or `None` if the object doesn't exist.
+        """
+
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            try:
+                try:
+                    result = self._request(obj)
+                except (IOError, OSError, ValueError):
+                    # The process died, start a new one and try again.
+                    self._stop()
+                    result = self._request(obj)
+            except Exception:
+                self._stop()
+                raise
+
+            timer = threading.Timer(_batch_timeout, lambda: self._idle(timer))
+            timer.daemon = True
+            timer.start()
+            self.timer = timer
+        return result
+
+
+def get_cat_file_server(git_tree, check=False):
+    """Get the `cat-file` server for the repository."""
+
+    key = (git_tree, check)
+    with _batch_lock:
+        server = _batch_servers.get(key)
+        if server is None:
+            server = CatFileServer(git_tree, check)
+            _batch_servers[key] = server
+    return server
+
+
+def stop_cat_file_servers():
+    """Stop all `cat-file` servers."""
+
+    with _batch_lock:
+        servers = list(_batch_servers.values())
+        _batch_servers.clear()
+    for server in servers:
+        server.stop()
+
+
+def cat_file(git_tree, obj, check=False):
+    """Look up an object through the repository's `cat-file` server."""
+
+    # Requests are newline delimited, so objects with newlines can't be requested.
+    if "\n" in obj:
+        return None
+    return get_cat_file_server(git_tree, check).request(obj)
+
+
+def gitopen(args, git_tree=None, write=False):
+    """Call Git with arguments (commands that write are run one at a time per repository)."""
 
     if git_tree is not None:
         cmd = [_git_path, "--work-tree=%s" % git_tree, "--git-dir=%s" % get_git_dir(git_tree)] + args
     else:
         cmd = [_git_path] + args
 
-    env = os.environ.copy()
-    env['LC_ALL'] = 'en_US'
-
-    if _PLATFORM == "windows":
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        process = subprocess.Popen(
-            cmd,
-            startupinfo=startupinfo,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE,
-            shell=False,
-            env=env
-        )
-    else:
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE,
-            shell=False,
-            env=env
-        )
-    output = process.communicate()
-    returncode = process.returncode
-
-    assert returncode == 0, "Runtime Error: %s" % output[0].rstrip()
-
-    return output[0]
+    return runner.run(cmd, repo=git_tree if write else None)
 
 
 def show(target, rev):
@@ -131,23 +298,66 @@ def show(target, rev):
     if _PLATFORM == "windows":
         target = target.replace("\\", "/")
     if git_tree is not None:
-        bfr = gitopen(["show", "%s:%s" % (rev, target)], git_tree)
+        if _read_objects:
+            commit = get_head(git_tree) if rev == "HEAD" else rev
+            if commit is not None and gitobjects.RE_SHA.match(commit):
+                store = gitobjects.get_store(vcroot.get_git_common_dir(get_git_dir(git_tree)))
+                if store:
+                    try:
+                        return store.get_blob(commit, target)
+                    except Exception:
+                        # Fall back to Git for anything we can't read.
+                        pass
+        result = cat_file(git_tree, "%s:%s" % (rev, target))
+        if result is not None and result[1] == "blob":
+            bfr = result[3]
     return bfr
 
 
-def getrevision(target, count=1):
-    """Get revision(s)."""
+def log(target, limit=0, skip=0):
+    """Get the file's log as a list of `LogEntry` records (newest first)."""
 
     assert os.path.exists(target), "%s does not exist!" % target
     git_tree = get_git_tree(target)
-    revs = None
-
+    entries = []
     if git_tree is not None:
-        revs = []
-        lg = gitopen(["log", "--no-color", "--pretty=oneline", "-n", str(count), target], git_tree)
-        for m in re.finditer(br"([a-f\d]{40}) .*\r?\n", lg):
-            revs.append(m.group(1).decode("utf-8"))
-    return revs
+        args = ["log", "--no-color", "--format=%H%x1f%at%x1f%an%x1f%s"]
+        if limit != 0:
+            args += ["-n", str(limit)]
+        if skip != 0:
+            args.append("--skip=%d" % skip)
+        lg = gitopen(args + ["--", target], git_tree)
+        for line in lg.split(b"\n"):
+            fields = line.decode("utf-8", "replace").split("\x1f")
+            if len(fields) == 4:
+                entries.append(LogEntry(fields[0], int(fields[1]), fields[2], fields[3]))
+    return entries
+
+
+def get_history(target, start=0, count=1):
+    """
+    Get `count` log records of the file starting at index `start`.
+
+    The history is cached until `HEAD` moves, so asking again only runs `git log`
+    for records that haven't been fetched yet.
+    """
+
+    head = get_head(target)
+    if head is None:
+        return log(target, count, start)
+    return _history.get(
+        (target, head), start, count,
+        lambda records, wanted: log(target, wanted, len(records))
+    )
+
+
+def getrevision(target, count=1):
+    """Get revision(s)."""
+
+    assert os.path.exists(target), "%s does not exist!" % target
+    if get_git_tree(target) is None:
+        return None
+    return [entry.node for entry in get_history(target, 0, count)]
 
 
 def checkout(target, rev=None):
@@ -162,7 +372,7 @@ def checkout(target, rev=None):
             args.append(rev)
         args.append(target)
 
-        gitopen(args, git_tree)
+        gitopen(args, git_tree, write=True)
 
 
 def diff(target, last=False):
@@ -197,34 +407,301 @@ def diff(target, last=False):
     return results
 
 
+def _get_stamp(path):
+    """Get the modified time and size of a file (`None` if it doesn't exist)."""
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns if hasattr(st, "st_mtime_ns") else st.st_mtime, st.st_size)
+
+
+def _get_ctime_ns(path):
+    """Get the latest modified or changed time of a path in nanoseconds."""
+
+    st = os.stat(path)
+    if hasattr(st, "st_mtime_ns"):
+        return max(st.st_mtime_ns, st.st_ctime_ns)
+    return int(max(st.st_mtime, st.st_ctime) * 1e9)
+
+
+class StatusSnapshot(object):
+    """
+    Status of a whole Git work tree from a single `git status --porcelain=v2 -z --ignored`.
+
+    Paths are indexed so that the state of any path can be looked up without running Git.
+    Files that are not listed are clean tracked files.  The snapshot is rebuilt when
+    the index, `HEAD`, or the ignore files change, and paths that were touched after
+    the snapshot was taken are refreshed individually.
+    """
+
+    def __init__(self, git_tree):
+        """Initialize."""
+
+        self.git_tree = git_tree
+        self.git_dir = get_git_dir(git_tree)
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.time = 0
+        self.modified = {}
+        self.untracked = set()
+        self.ignored = set()
+        # Stamps of the paths refreshed individually since the snapshot was taken.
+        self.paths = {}
+
+    def get_stamps(self):
+        """Get the stamps of the files whose changes invalidate the whole snapshot."""
+
+        common_dir = vcroot.get_git_common_dir(self.git_dir)
+        return (
+            _get_stamp(os.path.join(self.git_dir, "index")),
+            _get_stamp(os.path.join(self.git_dir, "HEAD")),
+            get_head(self.git_tree),
+            _get_stamp(os.path.join(self.git_tree, ".gitignore")),
+            _get_stamp(os.path.join(common_dir, "info", "exclude"))
+        )
+
+    def run_status(self, path=None):
+        """Run `git status` and parse the entries."""
+
+        args = ["status", "--porcelain=v2", "-z", "--ignored"]
+        if has_capability("no_optional_locks"):
+            # Don't let status refresh the index, it would invalidate the snapshot.
+            args.insert(0, "--no-optional-locks")
+        if path is not None:
+            args += ["--", path]
+        output = gitopen(args, self.git_tree)
+
+        modified = {}
+        untracked = set()
+        ignored = set()
+        fields = iter(output.split(b"\x00"))
+        for field in fields:
+            kind = field[:2]
+            if kind in (b"1 ", b"u "):
+                parts = field.split(b" ", 10 if kind == b"u " else 8)
+                if len(parts) in (9, 11):
+                    modified[parts[-1].decode("utf-8", "surrogateescape")] = parts[1].decode("utf-8")
+            elif kind == b"2 ":
+                parts = field.split(b" ", 9)
+                if len(parts) == 10:
+                    modified[parts[-1].decode("utf-8", "surrogateescape")] = parts[1].decode("utf-8")
+                # Skip the original path of the rename or copy.
+                next(fields, None)
+            elif kind == b"? ":
+                untracked.add(field[2:].decode("utf-8", "surrogateescape").rstrip("/"))
+            elif kind == b"! ":
+                ignored.add(field[2:].decode("utf-8", "surrogateescape").rstrip("/"))
+        return modified, untracked, ignored
+
+    def refresh(self):
+        """Rebuild the snapshot if the index, `HEAD`, or the ignore files changed."""
+
+        stamp = self.get_stamps()
+        if stamp != self.stamp:
+            self.rebuild(stamp)
+
+    def rebuild(self, stamp=None):
+        """Take a new snapshot of the whole work tree."""
+
+        if stamp is None:
+            stamp = self.get_stamps()
+        start = time.time()
+        self.modified, self.untracked, self.ignored = self.run_status()
+        self.paths.clear()
+        self.stamp = stamp
+        self.time = int(start * 1e9)
+
+    def refresh_path(self, path):
+        """Refresh the entries of a single path."""
+
+        for index in (self.modified, self.untracked, self.ignored):
+            if isinstance(index, dict):
+                index.pop(path, None)
+            else:
+                index.discard(path)
+        modified, untracked, ignored = self.run_status(path)
+        self.modified.update(modified)
+        self.untracked |= untracked
+        self.ignored |= ignored
+
+    def get_relative_path(self, target):
+        """Get the path relative to the work tree in Git's format."""
+
+        path = os.path.relpath(target, self.git_tree)
+        if _PLATFORM == "windows":
+            path = path.replace("\\", "/")
+        return "" if path == "." else path
+
+    def lookup(self, path):
+        """Look up the state of a relative path (ignored and untracked folders cover their content)."""
+
+        if path in self.modified:
+            return MODIFIED
+        parent = path
+        while parent:
+            if parent in self.ignored:
+                return IGNORED
+            if parent in self.untracked:
+                return UNTRACKED
+            parent = parent.rpartition("/")[0]
+        return TRACKED
+
+    def get_state(self, target):
+        """Get the state of a file or folder: `TRACKED`, `MODIFIED`, `UNTRACKED`, or `IGNORED`."""
+
+        with self.lock:
+            self.refresh()
+            path = self.get_relative_path(target)
+            try:
+                ctime = _get_ctime_ns(target)
+                stamp = (ctime, os.path.getsize(target))
+                touched = ctime >= self.time
+            except OSError:
+                stamp = None
+                touched = True
+            if touched and path and self.paths.get(path, False) != stamp:
+                # Only ask Git again when the path changed since it was last refreshed.
+                self.refresh_path(path)
+                self.paths[path] = stamp
+            return self.lookup(path)
+
+
+def get_status(target):
+    """Get the status snapshot of the repository the target belongs to."""
+
+    git_tree = get_git_tree(target)
+    if git_tree is None:
+        return None
+    with _status_lock:
+        snapshot = _status_snapshots.get(git_tree)
+        if snapshot is None:
+            snapshot = StatusSnapshot(git_tree)
+            _status_snapshots[git_tree] = snapshot
+    return snapshot
+
+
+def get_file_state(target):
+    """Get the state of a single file or folder with `git status --porcelain` (for Git without porcelain v2)."""
+
+    git_tree = get_git_tree(target)
+    if git_tree is None:
+        return None
+    output = gitopen(["status", "--ignored", "--porcelain", target], git_tree)
+    if output.startswith(b"!!"):
+        return IGNORED
+    elif output.startswith(b"??"):
+        return UNTRACKED
+    return MODIFIED if output.strip() else TRACKED
+
+
+def get_state(target):
+    """Get the state of a file or folder (`None` if it isn't in a Git work tree)."""
+
+    if not has_capability("status_v2"):
+        return get_file_state(target)
+    snapshot = get_status(target)
+    return snapshot.get_state(target) if snapshot is not None else None
+
+
 def is_versioned(target):
     """Check if file/folder is versioned."""
 
     assert os.path.exists(target), "%s does not exist!" % target
+    return get_state(target) in (TRACKED, MODIFIED)
+
+
+def get_changes(target):
+    """Get the files with changes that are not committed in the work tree the target belongs to (sorted)."""
+
     git_tree = get_git_tree(target)
+    if git_tree is None:
+        return []
+
+    if has_capability("status_v2"):
+        snapshot = get_status(target)
+        with snapshot.lock:
+            # Work tree edits are only picked up per path, so take a fresh snapshot.
+            snapshot.rebuild()
+            paths = list(snapshot.modified)
+    else:
+        output = gitopen(["status", "--porcelain", "-z", "--untracked-files=no"], git_tree)
+        paths = []
+        fields = iter(output.split(b"\x00"))
+        for field in fields:
+            if len(field) > 3:
+                paths.append(field[3:].decode("utf-8", "surrogateescape"))
+                if field[:1] in (b"R", b"C"):
+                    # Skip the original path of the rename or copy.
+                    next(fields, None)
 
-    versioned = False
-    if git_tree is not None:
-        output = gitopen(["status", "--ignored", "--porcelain", target], git_tree)
-        if not (output.startswith(b"!!") or output.startswith(b"??")):
-            versioned = True
+    files = [os.path.normpath(os.path.join(git_tree, path)) for path in paths]
+    return sorted(f for f in files if os.path.isfile(f))
 
-    return versioned
 
+def is_dirty(target):
+    """Check if a versioned file/folder has changes that are not committed."""
+
+    assert os.path.exists(target), "%s does not exist!" % target
+    return get_state(target) == MODIFIED
 
-def version():
-    """Get Git app version."""
+
+def _probe(path):
+    """Get the version and capabilities of the Git executable."""
 
     version = None
-    output = gitopen(['--version'])
+    output = runner.run([path, '--version'])
     m = re.search(br" version ([\d\.A-Za-z]+)", output)
     if m is not None:
         version = m.group(1).decode('utf-8')
-    return version
+    info = tools.parse_version(version)
+    capabilities = set(["cat_file_batch"])
+    if info >= (2, 11):
+        capabilities.add("status_v2")
+    if info >= (2, 15):
+        capabilities.add("no_optional_locks")
+    return version, capabilities
+
+
+def get_tool():
+    """Get the Git tool info (cached)."""
+
+    return tools.get_tool(_git_path, _probe)
+
+
+def has_capability(capability):
+    """Check if the Git executable has the capability."""
+
+    tool = get_tool()
+    return tool is not None and capability in tool.capabilities
+
+
+def version():
+    """Get Git app version."""
+
+    tool = get_tool()
+    return tool.version if tool is not None else None
 
 
 def set_git_path(pth):
     """Set Git path."""
 
     global _git_path
+    if pth != _git_path:
+        stop_cat_file_servers()
     _git_path = pth
+
+
+def set_read_objects(enable):
+    """Enable or disable reading file content straight from the object database."""
+
+    global _read_objects
+    _read_objects = enable
+
+
+def set_batch_timeout(timeout):
+    """Set how long (in seconds) an unused `cat-file` server is kept running."""
+
+    global _batch_timeout
+    _batch_timeout = timeout
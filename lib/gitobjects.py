@@ -0,0 +1,388 @@
+"""
+Git object reader.
+
+Read commits, trees, and blobs straight from a repository's loose objects and pack files
+so that file content can be looked up without starting Git.
+
+Copyright (c) 2013 - 2015 Isaac Muse <isaacmuse@gmail.com>
+License: MIT
+"""
+import binascii
+import os
+import re
+import struct
+import threading
+import zlib
+from .cache import LRUCache
+
+OBJ_COMMIT = 1
+OBJ_TREE = 2
+OBJ_BLOB = 3
+OBJ_TAG = 4
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+
+TYPE_NAMES = {
+    b"commit": OBJ_COMMIT,
+    b"tree": OBJ_TREE,
+    b"blob": OBJ_BLOB,
+    b"tag": OBJ_TAG
+}
+
+IDX_MAGIC = b"\xfftOc"
+
+# Maximum length of a delta chain before we give up.
+MAX_DELTA_DEPTH = 1000
+
+# Number of tree entries kept in the tree cache.
+TREE_CACHE_SIZE = 200000
+
+RE_SHA = re.compile(r"^[a-f\d]{40}$")
+
+_stores_lock = threading.Lock()
+_stores = {}
+
+
+class UnsupportedRepository(Exception):
+    """Repository uses features the reader can't handle."""
+
+
+class ObjectMissing(Exception):
+    """Object is not in the repository."""
+
+
+class _PackIndex(object):
+    """Version 2 pack index."""
+
+    def __init__(self, path):
+        """Read the index."""
+
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != IDX_MAGIC or struct.unpack(">I", data[4:8])[0] != 2:
+            raise UnsupportedRepository("Unsupported pack index %s" % path)
+        self.data = data
+        self.fanout = struct.unpack(">256I", data[8:8 + 1024])
+        self.count = self.fanout[255]
+        self.sha_start = 8 + 1024
+        self.offset_start = self.sha_start + self.count * 24
+        self.large_start = self.offset_start + self.count * 4
+
+    def find(self, sha):
+        """Get the pack offset of the object or `None` if it isn't in this pack."""
+
+        data = self.data
+        first = sha[0]
+        lo = self.fanout[first - 1] if first else 0
+        hi = self.fanout[first]
+        start = self.sha_start
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = start + mid * 20
+            current = data[pos:pos + 20]
+            if current < sha:
+                lo = mid + 1
+            elif current > sha:
+                hi = mid
+            else:
+                pos = self.offset_start + mid * 4
+                offset = struct.unpack(">I", data[pos:pos + 4])[0]
+                if offset & 0x80000000:
+                    pos = self.large_start + (offset & 0x7fffffff) * 8
+                    offset = struct.unpack(">Q", data[pos:pos + 8])[0]
+                return offset
+        return None
+
+
+def _read_varint_header(f):
+    """Read a pack object header and return the type and size."""
+
+    byte = f.read(1)[0]
+    kind = (byte >> 4) & 7
+    size = byte & 0x0f
+    shift = 4
+    while byte & 0x80:
+        byte = f.read(1)[0]
+        size |= (byte & 0x7f) << shift
+        shift += 7
+    return kind, size
+
+
+def _read_ofs(f):
+    """Read the negative base offset of an offset delta."""
+
+    byte = f.read(1)[0]
+    offset = byte & 0x7f
+    while byte & 0x80:
+        byte = f.read(1)[0]
+        offset = ((offset + 1) << 7) | (byte & 0x7f)
+    return offset
+
+
+def _inflate(f, size):
+    """Inflate a zlib stream from the file's current position."""
+
+    decompressor = zlib.decompressobj()
+    out = []
+    total = 0
+    while not decompressor.eof:
+        chunk = f.read(max(4096, size - total + 64))
+        if not chunk:
+            break
+        data = decompressor.decompress(chunk)
+        total += len(data)
+        out.append(data)
+    data = b"".join(out)
+    if len(data) != size:
+        raise ValueError("Corrupt pack object")
+    return data
+
+
+def _delta_size(delta, pos):
+    """Read a size from a delta."""
+
+    size = 0
+    shift = 0
+    while True:
+        byte = delta[pos]
+        pos += 1
+        size |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return size, pos
+
+
+def apply_delta(base, delta):
+    """Apply a Git delta to the base content."""
+
+    src_size, pos = _delta_size(delta, 0)
+    dst_size, pos = _delta_size(delta, pos)
+    if src_size != len(base):
+        raise ValueError("Delta base size mismatch")
+
+    out = []
+    end = len(delta)
+    while pos < end:
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            offset = 0
+            size = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (i * 8)
+                    pos += 1
+            for i in range(3):
+                if op & (0x10 << i):
+                    size |= delta[pos] << (i * 8)
+                    pos += 1
+            if size == 0:
+                size = 0x10000
+            out.append(base[offset:offset + size])
+        elif op:
+            out.append(delta[pos:pos + op])
+            pos += op
+        else:
+            raise ValueError("Invalid delta instruction")
+
+    data = b"".join(out)
+    if len(data) != dst_size:
+        raise ValueError("Delta result size mismatch")
+    return data
+
+
+class ObjectStore(object):
+    """Read objects from a Git directory."""
+
+    def __init__(self, git_dir):
+        """Initialize."""
+
+        self.git_dir = git_dir
+        self.objects = os.path.join(git_dir, "objects")
+        self.lock = threading.Lock()
+        self.packs = {}
+        self.trees = LRUCache(TREE_CACHE_SIZE)
+        self.commits = LRUCache(1000)
+        self.check_support()
+
+    def check_support(self):
+        """Make sure the repository doesn't use features we can't read."""
+
+        config = os.path.join(self.git_dir, "config")
+        if os.path.isfile(config):
+            with open(config, "r", errors="replace") as f:
+                text = f.read().lower()
+            if "objectformat" in text or "partialclone" in text or "promisor" in text:
+                raise UnsupportedRepository("Repository uses extensions")
+        if os.path.exists(os.path.join(self.objects, "info", "alternates")):
+            raise UnsupportedRepository("Repository uses alternates")
+
+    def get_packs(self):
+        """Get the pack indexes (reloaded when packs are added or removed)."""
+
+        pack_dir = os.path.join(self.objects, "pack")
+        try:
+            names = os.listdir(pack_dir)
+        except OSError:
+            names = []
+
+        if any(name.endswith(".promisor") for name in names):
+            raise UnsupportedRepository("Repository has promisor packs")
+
+        packs = {}
+        for name in names:
+            if name.endswith(".idx"):
+                base = os.path.join(pack_dir, name[:-4])
+                if not os.path.isfile(base + ".pack"):
+                    continue
+                index = self.packs.get(base)
+                if index is None:
+                    index = _PackIndex(base + ".idx")
+                packs[base] = index
+        with self.lock:
+            self.packs = packs
+        return packs
+
+    def read_loose(self, hex_sha):
+        """Read a loose object."""
+
+        path = os.path.join(self.objects, hex_sha[:2], hex_sha[2:])
+        try:
+            with open(path, "rb") as f:
+                data = zlib.decompress(f.read())
+        except (IOError, OSError):
+            return None
+        header, _, content = data.partition(b"\x00")
+        kind, _, size = header.partition(b" ")
+        if kind not in TYPE_NAMES or int(size) != len(content):
+            raise ValueError("Corrupt loose object %s" % hex_sha)
+        return TYPE_NAMES[kind], content
+
+    def find_packed(self, sha):
+        """Find the pack and offset of an object."""
+
+        for base, index in self.get_packs().items():
+            offset = index.find(sha)
+            if offset is not None:
+                return base + ".pack", offset
+        return None
+
+    def read_packed(self, pack, offset):
+        """Read an object from a pack, resolving delta chains."""
+
+        deltas = []
+        with open(pack, "rb") as f:
+            while True:
+                if len(deltas) > MAX_DELTA_DEPTH:
+                    raise ValueError("Delta chain is too long")
+                f.seek(offset)
+                kind, size = _read_varint_header(f)
+                if kind == OBJ_OFS_DELTA:
+                    base_offset = offset - _read_ofs(f)
+                    deltas.append(_inflate(f, size))
+                    offset = base_offset
+                elif kind == OBJ_REF_DELTA:
+                    base_sha = f.read(20)
+                    deltas.append(_inflate(f, size))
+                    kind, data = self.read_raw(base_sha)
+                    break
+                elif kind in (OBJ_COMMIT, OBJ_TREE, OBJ_BLOB, OBJ_TAG):
+                    data = _inflate(f, size)
+                    break
+                else:
+                    raise ValueError("Unknown pack object type %d" % kind)
+
+        for delta in reversed(deltas):
+            data = apply_delta(data, delta)
+        return kind, data
+
+    def read_raw(self, sha):
+        """Read an object by its binary SHA1."""
+
+        hex_sha = binascii.hexlify(sha).decode("ascii")
+        result = self.read_loose(hex_sha)
+        if result is None:
+            location = self.find_packed(sha)
+            if location is None:
+                raise ObjectMissing(hex_sha)
+            result = self.read_packed(*location)
+        return result
+
+    def read(self, hex_sha):
+        """Read an object by its hex SHA1 and return the type and content."""
+
+        return self.read_raw(binascii.unhexlify(hex_sha))
+
+    def get_tree(self, sha):
+        """Get the parsed entries of a tree: `{name: (mode, sha)}`."""
+
+        entries = self.trees.get(sha)
+        if entries is None:
+            kind, data = self.read_raw(sha)
+            if kind != OBJ_TREE:
+                raise ValueError("Not a tree")
+            entries = {}
+            pos = 0
+            end = len(data)
+            while pos < end:
+                space = data.index(b" ", pos)
+                nul = data.index(b"\x00", space)
+                entries[data[space + 1:nul]] = (data[pos:space], data[nul + 1:nul + 21])
+                pos = nul + 21
+            self.trees.put(sha, entries, max(len(entries), 1))
+        return entries
+
+    def get_commit_tree(self, hex_sha):
+        """Get the binary SHA1 of a commit's root tree."""
+
+        tree = self.commits.get(hex_sha)
+        if tree is None:
+            kind, data = self.read(hex_sha)
+            # Peel annotated tags.
+            while kind == OBJ_TAG:
+                kind, data = self.read(data[7:47].decode("ascii"))
+            if kind != OBJ_COMMIT or not data.startswith(b"tree "):
+                raise ValueError("Not a commit")
+            tree = binascii.unhexlify(data[5:45])
+            self.commits.put(hex_sha, tree)
+        return tree
+
+    def get_blob(self, commit, path):
+        """Get the content of the file at `path` (a `/` separated path) in the commit, or `None` if it isn't there."""
+
+        sha = self.get_commit_tree(commit)
+        parts = path.encode("utf-8").split(b"/")
+        for i, part in enumerate(parts):
+            entry = self.get_tree(sha).get(part)
+            if entry is None:
+                return None
+            mode, sha = entry
+            is_last = i == len(parts) - 1
+            if mode.startswith(b"160000"):
+                # Submodule.
+                return None
+            if is_last != (not mode.startswith(b"40000")):
+                return None
+        kind, data = self.read_raw(sha)
+        return data if kind == OBJ_BLOB else None
+
+
+def get_store(git_dir):
+    """Get the object store of the Git directory."""
+
+    with _stores_lock:
+        store = _stores.get(git_dir)
+        if store is None:
+            try:
+                store = ObjectStore(git_dir)
+            except UnsupportedRepository:
+                store = False
+            _stores[git_dir] = store
+    return store
+
+
+def clear():
+    """Forget all object stores."""
+
+    with _stores_lock:
+        _stores.clear()
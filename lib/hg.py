@@ -4,11 +4,18 @@ Hg.
 Copyright (c) 2013 - 2015 Isaac Muse <isaacmuse@gmail.com>
 License: MIT
 """
-import xml.etree.ElementTree as ET
+from collections import namedtuple
+import binascii
 import os
 import re
+import struct
 import subprocess
 import sys
+import threading
+from . import vcroot
+from . import runner
+from . import tools
+from .cache import HistoryCache
 
 if sys.platform.startswith('win'):
     _PLATFORM = "windows"
@@ -19,64 +26,292 @@ else:
 
 _hg_path = "hg.exe" if _PLATFORM == "windows" else "hg"
 
+LOG_SEP = "\x1f"
+LOG_TEMPLATE = "{node}\\x1f{rev}\\x1f{date|hgdate}\\x1f{author|person}\\x1f{desc|firstline}\\n"
+
+# Number of log records kept in the history cache.
+HISTORY_CACHE_SIZE = 100000
+
+_history = HistoryCache(HISTORY_CACHE_SIZE)
+
+# Start of the docket of version 2 `dirstate` files.
+DIRSTATE_V2_MARKER = b"dirstate-v2\n"
+
+LogEntry = namedtuple("LogEntry", ["node", "rev", "date", "author", "summary"])
+
+# Route commands through a persistent `hg serve --cmdserver pipe` process per repository.
+_use_server = True
+
+# Seconds a command server can sit unused before it is shut down.
+_server_timeout = 60
+
+_server_lock = threading.Lock()
+_servers = {}
+
 
 def which():
     """See if executable exists."""
 
-    location = None
-    if os.path.basename(_hg_path) != _hg_path:
-        if os.path.isfile(_hg_path):
-            location = _hg_path
-    else:
-        paths = [x for x in os.environ["PATH"].split(os.pathsep) if not x.isspace()]
-        for path in paths:
-            exe = os.path.join(path, _hg_path)
-            if os.path.isfile(exe):
-                location = exe
-                break
-    return location
+    return tools.which(_hg_path)
 
 
-def hgopen(args, cwd=None):
-    """Call Git with arguments."""
+def get_hg_root(target):
+    """Get the Mercurial repository root."""
 
-    returncode = None
-    output = None
+    return vcroot.find_root(target, vcroot.HG)
 
-    cmd = [_hg_path] + args
 
-    env = os.environ.copy()
-    env['LC_ALL'] = 'en_US'
-
-    if _PLATFORM == "windows":
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        process = subprocess.Popen(
-            cmd,
-            startupinfo=startupinfo,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE,
-            cwd=cwd,
-            shell=False,
-            env=env
-        )
-    else:
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE,
-            cwd=cwd,
-            shell=False,
-            env=env
-        )
-    output = process.communicate()
-    returncode = process.returncode
+def get_parent(target):
+    """
+    Get the working directory parent by reading the `dirstate` directly.
+
+    Version 1 `dirstate` files start with the parent node.  Version 2 files start with the
+    `DIRSTATE_V2_MARKER` followed by the parent node padded to 32 bytes.  If the parent can't be
+    read, a token made from the `dirstate`'s modification time and size is returned instead.
+    """
+
+    root = get_hg_root(target)
+    if root is None:
+        return None
+    path = os.path.join(root, ".hg", "dirstate")
+    try:
+        with open(path, "rb") as f:
+            data = f.read(len(DIRSTATE_V2_MARKER) + 20)
+        st = os.stat(path)
+    except OSError:
+        return None
+    node = data[len(DIRSTATE_V2_MARKER):] if data.startswith(DIRSTATE_V2_MARKER) else data[:20]
+    if len(node) == 20:
+        return binascii.hexlify(node).decode('ascii')
+    return "%d-%d" % (st.st_mtime_ns if hasattr(st, "st_mtime_ns") else int(st.st_mtime * 1e9), st.st_size)
+
+
+def get_cwd(target):
+    """Get the folder to run `hg` from (the repository root if there is one)."""
 
-    assert returncode == 0, "Runtime Error: %s\n%s" % (output[0].rstrip(), str(cmd))
+    root = get_hg_root(target)
+    return root if root is not None else os.path.dirname(target)
 
-    return output[0]
+
+def _get_env():
+    """Get the environment for `hg` processes."""
+
+    return runner.get_env(HGPLAIN='1', HGENCODING='UTF-8')
+
+
+class CommandServerError(Exception):
+    """Command server failed."""
+
+
+class CommandServer(object):
+    """
+    Persistent `hg serve --cmdserver pipe` process for a repository.
+
+    Commands are sent with the command server's `runcommand` request, and the replies are
+    read from the output (`o`), error (`e`), and result (`r`) channels.  This avoids paying
+    Mercurial's startup cost on every command.  The process is restarted if it dies, and
+    shut down after it has not been used for `_server_timeout` seconds.
+    """
+
+    def __init__(self, root):
+        """Initialize."""
+
+        self.root = root
+        self.lock = threading.Lock()
+        self.process = None
+        self.timer = None
+
+    def start(self):
+        """Start the process and read the hello message."""
+
+        self.process = runner.popen(
+            [_hg_path, "serve", "--cmdserver", "pipe", "--config", "ui.interactive=False"],
+            self.root,
+            _get_env(),
+            subprocess.DEVNULL
+        )
+        channel, data = self.read_channel()
+        if channel != b"o" or b"runcommand" not in data.split(b"\n", 1)[0]:
+            raise CommandServerError("Unexpected command server hello")
+
+    def stop(self):
+        """Stop the process."""
+
+        with self.lock:
+            self._stop()
+
+    def _stop(self):
+        """Stop the process (lock must be held)."""
+
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.process is not None:
+            process = self.process
+            self.process = None
+            try:
+                process.stdin.close()
+            except Exception:
+                pass
+            try:
+                process.wait(1)
+            except Exception:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+    def _idle(self, timer):
+        """Shut down the process when it hasn't been used in a while."""
+
+        with self.lock:
+            # Ignore timers that were replaced by a newer command.
+            if timer is self.timer:
+                self.timer = None
+                self._stop()
+
+    def kill(self):
+        """Kill the process (used when a command takes too long)."""
+
+        process = self.process
+        if process is not None:
+            process.kill()
+
+    def read_exact(self, size):
+        """Read exactly `size` bytes."""
+
+        data = self.process.stdout.read(size)
+        if len(data) != size:
+            raise CommandServerError("Command server closed unexpectedly")
+        return data
+
+    def read_channel(self):
+        """Read a channel identifier and its data (input channels have no data, just a length)."""
+
+        channel, length = struct.unpack(">cI", self.read_exact(5))
+        if channel in (b"I", b"L"):
+            return channel, length
+        return channel, self.read_exact(length)
+
+    def _runcommand(self, args):
+        """Send the command and collect the output (the process is killed if it doesn't reply in time)."""
+
+        with runner.request("hg %s" % args[0], self.kill):
+            return self._communicate(args)
+
+    def _communicate(self, args):
+        """Send the command and read the reply."""
+
+        if self.process is None or self.process.poll() is not None:
+            self._stop()
+            self.start()
+
+        data = b"\x00".join(arg.encode("utf-8") for arg in args)
+        self.process.stdin.write(b"runcommand\n" + struct.pack(">I", len(data)) + data)
+        self.process.stdin.flush()
+
+        output = []
+        while True:
+            channel, data = self.read_channel()
+            if channel in (b"o", b"e"):
+                output.append(data)
+            elif channel == b"r":
+                return struct.unpack(">i", data)[0], b"".join(output)
+            elif channel in (b"I", b"L"):
+                # We never provide input.
+                self.process.stdin.write(struct.pack(">I", 0))
+                self.process.stdin.flush()
+            elif channel.isupper():
+                raise CommandServerError("Unsupported required channel %s" % channel.decode("ascii"))
+
+    def runcommand(self, args):
+        """Run the command and return the return code and the output."""
+
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            try:
+                try:
+                    result = self._runcommand(args)
+                except (IOError, OSError, ValueError, struct.error, CommandServerError):
+                    # The process died, start a new one and try again.
+                    self._stop()
+                    result = self._runcommand(args)
+            except Exception:
+                self._stop()
+                raise
+
+            timer = threading.Timer(_server_timeout, lambda: self._idle(timer))
+            timer.daemon = True
+            timer.start()
+            self.timer = timer
+        return result
+
+
+def get_command_server(root):
+    """Get the command server for the repository."""
+
+    with _server_lock:
+        server = _servers.get(root)
+        if server is None:
+            server = CommandServer(root)
+            _servers[root] = server
+    return server
+
+
+def stop_command_servers():
+    """Stop all command servers."""
+
+    with _server_lock:
+        servers = list(_servers.values())
+        _servers.clear()
+    for server in servers:
+        server.stop()
+
+
+def get_changelog_state(target):
+    """Get a token that changes whenever changesets are added to the repository."""
+
+    root = get_hg_root(target)
+    if root is None:
+        return None
+    for path in (os.path.join(root, ".hg", "store", "00changelog.i"), os.path.join(root, ".hg", "00changelog.i")):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        return "%d-%d" % (st.st_mtime_ns if hasattr(st, "st_mtime_ns") else int(st.st_mtime * 1e9), st.st_size)
+    return None
+
+
+def hgopen(args, cwd=None, write=False):
+    """Call `hg` with arguments (commands that write are run one at a time per repository)."""
+
+    cmd = [_hg_path] + args
+    root = get_hg_root(cwd) if cwd is not None else None
+    repo = root if write else None
+
+    if _use_server and root is not None and has_capability("cmdserver"):
+        lock = runner.get_repo_lock(repo) if repo is not None else None
+        try:
+            if lock is not None:
+                lock.acquire()
+            try:
+                returncode, output = get_command_server(root).runcommand(args)
+            finally:
+                if lock is not None:
+                    lock.release()
+        except runner.ProcessTimeout:
+            raise
+        except Exception:
+            # Fall back to a one-shot process.
+            pass
+        else:
+            if returncode != 0:
+                raise runner.ProcessError("Runtime Error: %s\n%s" % (output.rstrip(), str(cmd)))
+            return output
+
+    return runner.run(cmd, cwd, _get_env(), repo)
 
 
 def cat(target, rev=None):
@@ -86,26 +321,56 @@ def cat(target, rev=None):
     args = ["cat", target]
     if rev is not None:
         args += ["-r", str(rev)]
-    return hgopen(args, os.path.dirname(target))
+    return hgopen(args, get_cwd(target))
+
+
+def is_added(target):
+    """Check if the file is added but not committed yet."""
+
+    assert os.path.exists(target), "%s does not exist!" % target
+    return bool(hgopen(["status", "--added", "--no-status", target], get_cwd(target)).strip())
 
 
 def revert(target):
     """Revert file."""
 
     assert os.path.exists(target), "%s does not exist!" % target
-    hgopen(["revert", "--no-backup", target], os.path.dirname(target))
+    hgopen(["revert", "--no-backup", target], get_cwd(target), write=True)
 
 
 def getrevision(target, count=1):
     """Get revision(s)."""
 
     assert os.path.exists(target), "%s does not exist!" % target
-    results = log(target, count)
-    assert results is not None, "Failed to acquire log info!"
-    revs = []
-    for entry in results.findall('logentry'):
-        revs.append(entry.attrib["node"])
-    return revs
+    return [entry.node for entry in get_history(target, 0, count)]
+
+
+def get_history(target, start=0, count=1):
+    """
+    Get `count` log records of the file starting at index `start`.
+
+    The history is cached until the working directory parent or the changelog changes, so asking again
+    only runs `hg log` for records that haven't been fetched yet.
+    """
+
+    parent = get_parent(target)
+    tip = get_changelog_state(target)
+    if parent is None or tip is None:
+        return log(target, start + count)[start:]
+    return _history.get(
+        (target, parent, tip), start, count,
+        lambda records, wanted: _fetch_older(target, records, wanted)
+    )
+
+
+def _fetch_older(target, records, wanted):
+    """Fetch the records that come after the ones already known."""
+
+    if not records:
+        return log(target, wanted)
+    if records[-1].rev == 0:
+        return []
+    return log(target, wanted, records[-1].rev - 1)
 
 
 def diff(target, last=False):
@@ -121,59 +386,124 @@ def diff(target, last=False):
     else:
         args = ["diff", "-p"]
 
-    return hgopen(args + [target], os.path.dirname(target)) if args is not None else b""
+    return hgopen(args + [target], get_cwd(target)) if args is not None else b""
 
 
-def log(target=None, limit=0):
-    """Get `hg` log."""
+def iter_log(output):
+    """Parse the log output line by line."""
 
-    assert os.path.exists(target), "%s does not exist!" % target
+    for line in output.split(b"\n"):
+        fields = line.decode("utf-8", "replace").split(LOG_SEP)
+        if len(fields) == 5:
+            node, rev, date, author, summary = fields
+            yield LogEntry(node, int(rev), int(date.split(" ")[0]), author, summary)
 
-    args = ["log", "--style=xml"]
+
+def log(target=None, limit=0, start=None):
+    """
+    Get `hg` log.
+
+    Return a list of `LogEntry` records (newest first).  If `start` is given, only revisions
+    at or below `start` are listed, so the next page starts at the revision before the last
+    record of the current page.
+    """
+
+    if target is not None:
+        assert os.path.exists(target), "%s does not exist!" % target
+
+    args = ["log", "--template", LOG_TEMPLATE]
     if limit != 0:
         args.append("-l")
         args.append(str(limit))
+    if start is not None:
+        args += ["-r", "reverse(:%s)" % str(start)]
     if target is not None:
         args.append(target)
-    output = hgopen(args, os.path.dirname(target))
+    output = hgopen(args, get_cwd(target) if target is not None else None)
 
-    if output != "":
-        results = ET.fromstring(output)
-    else:
-        results = None
+    return list(iter_log(output))
+
+
+def get_changes(target):
+    """Get the modified and added files in the repository the target belongs to (sorted)."""
 
-    return results
+    root = get_hg_root(target)
+    if root is None:
+        return []
+    output = hgopen(["status", "--modified", "--added", "--no-status", "--print0"], root)
+    files = [
+        os.path.normpath(os.path.join(root, path.decode("utf-8", "surrogateescape")))
+        for path in output.split(b"\x00") if path
+    ]
+    return sorted(f for f in files if os.path.isfile(f))
 
 
 def is_versioned(target):
     """Check if file/folder is versioned."""
 
     assert os.path.exists(target), "%s does not exist!" % target
+    if get_hg_root(target) is None:
+        return False
+
     versioned = False
     try:
-        results = log(target, 1)
-        if results is not None:
-            if results.find("logentry") is not None:
-                versioned = True
+        versioned = len(log(target, 1)) > 0
     except Exception:
         pass
 
     return versioned
 
 
-def version():
-    """Get `hg` app version."""
+def _probe(path):
+    """Get the version and capabilities of the `hg` executable."""
 
     version = None
-    output = hgopen(['--version'])
+    output = runner.run([path, '--version'])
     m = re.search(br"\bversion ([\d\.A-Za-z]+)", output)
     if m is not None:
         version = m.group(1).decode('utf-8')
-    return version
+    info = tools.parse_version(version)
+    capabilities = set(["template"])
+    if info >= (1, 9):
+        capabilities.add("cmdserver")
+    return version, capabilities
+
+
+def get_tool():
+    """Get the `hg` tool info (cached)."""
+
+    return tools.get_tool(_hg_path, _probe)
+
+
+def has_capability(capability):
+    """Check if the `hg` executable has the capability."""
+
+    tool = get_tool()
+    return tool is not None and capability in tool.capabilities
+
+
+def version():
+    """Get `hg` app version."""
+
+    tool = get_tool()
+    return tool.version if tool is not None else None
 
 
 def set_hg_path(pth):
     """Set `hg` path."""
 
     global _hg_path
+    if pth != _hg_path:
+        stop_command_servers()
     _hg_path = pth
+
+
+def set_command_server(enable, timeout=60):
+    """Enable or disable the command server and set how long (in seconds) an unused server is kept running."""
+
+    global _use_server
+    global _server_timeout
+    if not enable:
+        stop_command_servers()
+    _use_server = enable
+    _server_timeout = timeout
@@ -0,0 +1,207 @@
+"""
+Process runner for version control tools.
+
+Copyright (c) 2013 - 2015 Isaac Muse <isaacmuse@gmail.com>
+License: MIT
+"""
+from contextlib import contextmanager
+import os
+import subprocess
+import sys
+import threading
+import time
+
+_PLATFORM = "windows" if sys.platform.startswith('win') else "other"
+
+# Seconds a command may run before it is killed.
+_timeout = 60
+
+# Maximum number of version control processes running at the same time.
+_max_processes = 4
+
+_slots = threading.BoundedSemaphore(_max_processes)
+
+_env_lock = threading.Lock()
+_envs = {}
+
+_repo_lock = threading.Lock()
+_repo_locks = {}
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+class ProcessError(Exception):
+    """Command failed."""
+
+
+class ProcessTimeout(ProcessError):
+    """Command took too long and was killed."""
+
+
+def get_env(**extra):
+    """Get the environment for version control processes (prepared once per set of extra variables)."""
+
+    key = tuple(sorted(extra.items()))
+    with _env_lock:
+        env = _envs.get(key)
+        if env is None:
+            env = os.environ.copy()
+            env['LC_ALL'] = 'en_US'
+            env.update(extra)
+            _envs[key] = env
+    return env
+
+
+def get_startupinfo():
+    """Get the startup info to hide the console window on Windows."""
+
+    startupinfo = None
+    if _PLATFORM == "windows":
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return startupinfo
+
+
+def popen(cmd, cwd=None, env=None, stderr=subprocess.STDOUT):
+    """Start a process with piped input and output."""
+
+    return subprocess.Popen(
+        cmd,
+        startupinfo=get_startupinfo(),
+        stdout=subprocess.PIPE,
+        stderr=stderr,
+        stdin=subprocess.PIPE,
+        cwd=cwd,
+        shell=False,
+        env=env if env is not None else get_env()
+    )
+
+
+def get_repo_lock(repo):
+    """Get the lock that serializes commands that write to the repository."""
+
+    with _repo_lock:
+        lock = _repo_locks.get(repo)
+        if lock is None:
+            lock = threading.Lock()
+            _repo_locks[repo] = lock
+    return lock
+
+
+def record(name, elapsed):
+    """Record the latency of a command."""
+
+    with _stats_lock:
+        count, total, longest = _stats.get(name, (0, 0.0, 0.0))
+        _stats[name] = (count + 1, total + elapsed, max(longest, elapsed))
+
+
+def get_stats():
+    """Get the latency of the commands: `{name: (count, total seconds, longest seconds)}`."""
+
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _get_name(cmd):
+    """Get the name the latency of a command is recorded under (the tool and its sub command)."""
+
+    args = [os.path.splitext(os.path.basename(cmd[0]))[0]]
+    for arg in cmd[1:]:
+        if not arg.startswith("-"):
+            args.append(arg)
+            break
+    return " ".join(args)
+
+
+def run(cmd, cwd=None, env=None, repo=None, timeout=None):
+    """
+    Run a command and return its output.
+
+    The command waits for a free process slot, and commands given a `repo` are run
+    one at a time for that repository.  Raise `ProcessError` if the command fails,
+    and `ProcessTimeout` if it doesn't finish in time.
+    """
+
+    if timeout is None:
+        timeout = _timeout
+    lock = get_repo_lock(repo) if repo is not None else None
+    slots = _slots
+
+    if lock is not None:
+        lock.acquire()
+    try:
+        with slots:
+            start = time.time()
+            process = popen(cmd, cwd, env)
+            try:
+                output = process.communicate(timeout=timeout if timeout > 0 else None)[0]
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                raise ProcessTimeout("Timed out after %d seconds: %s" % (timeout, str(cmd)))
+            finally:
+                record(_get_name(cmd), time.time() - start)
+    finally:
+        if lock is not None:
+            lock.release()
+
+    if process.returncode != 0:
+        raise ProcessError("Runtime Error: %s\n%s" % (output.rstrip(), str(cmd)))
+    return output
+
+
+@contextmanager
+def request(name, kill, timeout=None):
+    """
+    Guard a request to a long running process (such as a command server).
+
+    The request waits for a free process slot like `run` and its latency is recorded
+    under `name`.  If it doesn't finish in time, `kill` is called to stop the process,
+    which unblocks any pending reads, and `ProcessTimeout` is raised.
+    """
+
+    if timeout is None:
+        timeout = _timeout
+    slots = _slots
+    expired = []
+
+    def expire():
+        """Stop the process."""
+
+        expired.append(True)
+        try:
+            kill()
+        except Exception:
+            pass
+
+    with slots:
+        timer = None
+        if timeout > 0:
+            timer = threading.Timer(timeout, expire)
+            timer.daemon = True
+            timer.start()
+        start = time.time()
+        try:
+            yield
+        except Exception:
+            if expired:
+                raise ProcessTimeout("Timed out after %d seconds: %s" % (timeout, name))
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+            record(name, time.time() - start)
+
+
+def configure(timeout=60, max_processes=4):
+    """Set the command timeout (in seconds, 0 for none) and the maximum number of concurrent processes."""
+
+    global _timeout
+    global _max_processes
+    global _slots
+    _timeout = timeout
+    if max_processes != _max_processes:
+        _max_processes = max(1, max_processes)
+        _slots = threading.BoundedSemaphore(_max_processes)
@@ -5,10 +5,23 @@ Copyright (c) 2013 - 2015 Isaac Muse <isaacmuse@gmail.com>
 License: MIT
 """
 import xml.etree.ElementTree as ET
+import calendar
+import hashlib
 import os
 import re
-import subprocess
+import shutil
 import sys
+import time
+from collections import namedtuple
+from urllib.request import pathname2url
+from . import vcroot
+from . import runner
+from . import tools
+from .cache import HistoryCache
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
 
 NO_LOCK = 0
 LOCAL_LOCK = 1
@@ -24,68 +37,199 @@ else:
 
 _svn_path = "svn.exe" if _PLATFORM == "windows" else "svn"
 
+# Read the working copy state from `.svn/wc.db` when possible.
+_use_wc_db = True
+
+# `wc.db` formats we know how to read (Subversion 1.7 - 1.14).
+WC_DB_FORMATS = (29, 30, 31)
+
+# Properties that make exported content differ from the pristine content.
+TRANSLATING_PROPS = (b"svn:keywords", b"svn:eol-style", b"svn:special")
+
+# Node presences that mean the path is not actually in the working copy.
+ABSENT_PRESENCE = ("not-present", "excluded", "server-excluded")
+
+# Number of log records kept in the history cache.
+HISTORY_CACHE_SIZE = 100000
+
+_history = HistoryCache(HISTORY_CACHE_SIZE)
+
+LogEntry = namedtuple("LogEntry", ["node", "rev", "date", "author", "summary"])
+
+WcNode = namedtuple(
+    "WcNode",
+    ["op_depth", "presence", "kind", "revision", "checksum", "translated_size", "last_mod_time", "properties"]
+)
+
 
 def which():
     """See if executable exists."""
 
-    location = None
-    if os.path.basename(_svn_path) != _svn_path:
-        if os.path.isfile(_svn_path):
-            location = _svn_path
-    else:
-        paths = [x for x in os.environ["PATH"].split(os.pathsep) if not x.isspace()]
-        for path in paths:
-            exe = os.path.join(path, _svn_path)
-            if os.path.isfile(exe):
-                location = exe
-                break
-    return location
+    return tools.which(_svn_path)
 
 
-def svnopen(args):
-    """Call SVN with arguments."""
+def get_wc_root(target):
+    """Get the working copy root (the folder holding `.svn`)."""
 
-    returncode = None
-    output = None
-    cmd = [_svn_path, "--non-interactive"] + args
+    return vcroot.find_root(target, vcroot.SVN)
 
-    env = os.environ.copy()
-    env['LC_ALL'] = 'en_US'
-
-    if _PLATFORM == "windows":
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        process = subprocess.Popen(
-            cmd,
-            startupinfo=startupinfo,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE,
-            shell=False,
-            env=env
-        )
-    else:
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE,
-            shell=False,
-            env=env
-        )
-    output = process.communicate()
-    returncode = process.returncode
 
-    assert returncode == 0, "Runtime Error: %s" % output[0].rstrip()
+def get_wc_state(target):
+    """Get a token that changes whenever the working copy metadata changes."""
+
+    root = get_wc_root(target)
+    if root is None or not os.path.isfile(os.path.join(root, ".svn", "wc.db")):
+        return None
+    st = os.stat(os.path.join(root, ".svn", "wc.db"))
+    return "%d-%d" % (st.st_mtime_ns if hasattr(st, "st_mtime_ns") else int(st.st_mtime * 1e9), st.st_size)
+
+
+def _wc_db_enabled():
+    """Check if the working copy state should be read from `wc.db`."""
+
+    return _use_wc_db and sqlite3 is not None and has_capability("wc_db")
+
+
+class WcDbError(Exception):
+    """The working copy database can't be used."""
+
+
+def _query_wc_db(root, sql, args):
+    """Run a query on the working copy database (opened read-only)."""
+
+    if sqlite3 is None:
+        raise WcDbError("sqlite3 is not available")
+    db = os.path.join(root, ".svn", "wc.db")
+    if not os.path.isfile(db):
+        raise WcDbError("No working copy database")
+
+    try:
+        conn = sqlite3.connect("file:%s?mode=ro" % pathname2url(db), uri=True, timeout=1)
+    except (TypeError, sqlite3.Error) as e:
+        raise WcDbError(str(e))
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version not in WC_DB_FORMATS:
+            raise WcDbError("Unsupported working copy format %d" % version)
+        return conn.execute(sql, args).fetchall()
+    except sqlite3.Error as e:
+        raise WcDbError(str(e))
+    finally:
+        conn.close()
+
+
+def query_wc_db(target):
+    """
+    Read the nodes of a path from the working copy database.
+
+    Return the `WcNode` rows (the working row first, the BASE row last), or an empty list
+    if the path isn't in the working copy.  Raise `WcDbError` if the database can't be read.
+    """
+
+    root = get_wc_root(target)
+    if root is None:
+        raise WcDbError("Not a working copy")
+    relpath = os.path.relpath(target, root)
+    relpath = "" if relpath == "." else relpath.replace("\\", "/")
+    rows = _query_wc_db(
+        root,
+        "SELECT op_depth, presence, kind, revision, checksum, translated_size, last_mod_time, properties "
+        "FROM nodes WHERE wc_id = (SELECT id FROM wcroot WHERE local_abspath IS NULL) AND local_relpath = ? "
+        "ORDER BY op_depth DESC",
+        (relpath,)
+    )
+    return [WcNode(*row) for row in rows]
+
+
+def get_node_state(target):
+    """
+    Get the versioned and modified state of a path from the working copy database.
+
+    Return `(versioned, modified)`.  `modified` is `None` when it can't be decided without
+    comparing content.  Raise `WcDbError` if the database can't be read.
+    """
+
+    nodes = query_wc_db(target)
+    if not nodes or nodes[0].presence in ABSENT_PRESENCE:
+        return False, False
+
+    node = nodes[0]
+    if node.op_depth > 0:
+        # Added, copied, moved, or deleted.
+        return True, True
+    if node.kind != "file":
+        return True, False
+
+    st = os.stat(target)
+    if (
+        node.translated_size is not None and node.last_mod_time is not None and
+        node.translated_size == st.st_size and node.last_mod_time == int(st.st_mtime * 1000000)
+    ):
+        return True, False
+    if node.translated_size is not None and node.translated_size != st.st_size:
+        return True, True
+    if (
+        node.checksum and node.checksum.startswith("$sha1$") and
+        not any(prop in (node.properties or b"") for prop in TRANSLATING_PROPS)
+    ):
+        # Without translation, the working file matches BASE if it has the same checksum.
+        sha1 = hashlib.sha1()
+        with open(target, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                sha1.update(chunk)
+        return True, sha1.hexdigest() != node.checksum[6:]
+    return True, None
+
+
+def get_pristine_path(target):
+    """
+    Get the file in the pristine store that holds the file's BASE content.
+
+    Return `None` if the pristine file can't be used as is: it is compressed, or the
+    file has properties (`svn:keywords`, `svn:eol-style`, `svn:special`) that make the
+    exported content differ from the pristine content.
+    """
+
+    nodes = query_wc_db(target)
+    if not nodes or nodes[-1].op_depth != 0 or nodes[-1].kind != "file" or not nodes[-1].checksum:
+        return None
+    node = nodes[-1]
+    properties = node.properties or b""
+    if any(prop in properties for prop in TRANSLATING_PROPS):
+        return None
 
-    return output[0]
+    root = get_wc_root(target)
+    rows = _query_wc_db(root, "SELECT compression FROM pristine WHERE checksum = ?", (node.checksum,))
+    if not rows or rows[0][0]:
+        return None
+
+    sha1 = node.checksum[6:] if node.checksum.startswith("$sha1$") else None
+    if sha1 is None:
+        return None
+    path = os.path.join(root, ".svn", "pristine", sha1[:2], sha1 + ".svn-base")
+    return path if os.path.isfile(path) else None
+
+
+def get_cwd(target):
+    """Get the folder to run SVN from (the working copy root if there is one)."""
+
+    root = get_wc_root(target)
+    return root if root is not None else os.path.dirname(target)
+
+
+def svnopen(args, cwd=None, write=False):
+    """Call SVN with arguments (commands that write are run one at a time per working copy)."""
+
+    cmd = [_svn_path, "--non-interactive"] + args
+    repo = (cwd if cwd is not None else "") if write else None
+    return runner.run(cmd, cwd, repo=repo)
 
 
 def revert(target):
     """Revert file."""
 
     assert os.path.exists(target), "%s does not exist!" % target
-    svnopen(["revert", target])
+    svnopen(["revert", target], get_cwd(target), write=True)
 
 
 def info(target):
@@ -95,7 +239,8 @@ def info(target):
         (target.startswith("http://") or target.startswith("https://")) or
         os.path.exists(target)
     ), "%s does not exist!" % target
-    output = svnopen(['info', "--xml", target])
+    cwd = None if target.startswith(("http://", "https://")) else get_cwd(target)
+    output = svnopen(['info', "--xml", target], cwd)
     return ET.fromstring(output)
 
 
@@ -151,19 +296,76 @@ def getrevision(pth):
     return keys.get(search_targets[0])
 
 
+def log(target, limit=0, start=None):
+    """
+    Get the file's log as a list of `LogEntry` records (newest first).
+
+    If `start` is given, only revisions at or below `start` are listed.
+    """
+
+    assert os.path.exists(target), "%s does not exist!" % target
+    args = ["log", "--xml"]
+    if limit != 0:
+        args += ["-l", str(limit)]
+    if start is not None:
+        args += ["-r", "%d:1" % start]
+    output = svnopen(args + [target], get_cwd(target))
+
+    entries = []
+    for entry in ET.fromstring(output).findall("logentry"):
+        rev = int(entry.attrib["revision"])
+        author = entry.findtext("author", "")
+        msg = entry.findtext("msg", "").strip()
+        date = entry.findtext("date", "")
+        try:
+            date = calendar.timegm(time.strptime(date[:19], "%Y-%m-%dT%H:%M:%S"))
+        except ValueError:
+            date = 0
+        entries.append(LogEntry(str(rev), rev, date, author, msg.split("\n", 1)[0]))
+    return entries
+
+
+def get_history(target, start=0, count=1):
+    """
+    Get `count` log records of the file starting at index `start`.
+
+    The history is cached until the working copy changes, so asking again
+    only runs `svn log` for records that haven't been fetched yet.
+    """
+
+    state = get_wc_state(target)
+    if state is None:
+        return log(target, start + count)[start:]
+    return _history.get(
+        (target, state), start, count,
+        lambda records, wanted: _fetch_older(target, records, wanted)
+    )
+
+
+def _fetch_older(target, records, wanted):
+    """Fetch the records that come after the ones already known."""
+
+    if not records:
+        return log(target, wanted)
+    if records[-1].rev <= 1:
+        return []
+    return log(target, wanted, records[-1].rev - 1)
+
+
 def diff(target, last=False):
     """Get SVN diff of last version."""
 
     assert os.path.exists(target), "%s does not exist!" % target
     assert os.path.isfile(target), "%s is not a file!" % target
-    return svnopen(['diff', '-rPREV', target]) if last else svnopen(['diff', target])
+    args = ['diff', '-rPREV', target] if last else ['diff', target]
+    return svnopen(args, get_cwd(target))
 
 
 def commit(pth, msg=""):
     """Commit changes."""
 
     assert os.path.exists(pth), "%s does not exist!" % pth
-    svnopen(["commit", pth, "-m", msg])
+    svnopen(["commit", pth, "-m", msg], get_cwd(pth), write=True)
 
 
 def checklock(pth):
@@ -205,7 +407,7 @@ def lock(pth):
     """Lock file."""
 
     assert os.path.exists(pth), "%s does not exist!" % pth
-    svnopen(['lock', pth])
+    svnopen(['lock', pth], get_cwd(pth), write=True)
 
 
 def breaklock(pth, force=False):
@@ -219,7 +421,7 @@ def breaklock(pth, force=False):
     else:
         args.append(pth)
 
-    svnopen(args)
+    svnopen(args, get_cwd(pth), write=True)
 
 
 def checkout(url, pth):
@@ -233,7 +435,7 @@ def update(pth):
     """Update SVN directory."""
 
     assert os.path.exists(pth), "%s does not exist!" % pth
-    svnopen(['update', pth])
+    svnopen(['update', pth], get_cwd(pth), write=True)
 
 
 def export(url, name, rev=None):
@@ -248,18 +450,62 @@ def export(url, name, rev=None):
     assert os.path.exists(name), "%s appears to not have been exported!" % name
 
 
+def _get_pristine(target):
+    """Get the pristine file of the target if reading `wc.db` is enabled and the pristine file can be used."""
+
+    pristine = None
+    if _wc_db_enabled():
+        try:
+            pristine = get_pristine_path(target)
+        except (WcDbError, OSError):
+            pass
+    return pristine
+
+
+def export_base(target, name):
+    """Export the BASE content of a working copy file, copying it from the pristine store when possible."""
+
+    assert os.path.exists(target), "%s does not exist!" % target
+
+    pristine = _get_pristine(target)
+    if pristine is not None:
+        shutil.copyfile(pristine, name)
+    else:
+        export(target, name, rev="BASE")
+
+
+def cat(target, rev="BASE"):
+    """Get the content of a file at the revision (`BASE` is read from the pristine store when possible)."""
+
+    assert os.path.exists(target), "%s does not exist!" % target
+
+    pristine = _get_pristine(target) if rev == "BASE" else None
+    if pristine is not None:
+        with open(pristine, "rb") as f:
+            return f.read()
+    return svnopen(["cat", "-r", str(rev), target], get_cwd(target))
+
+
+def is_added(target):
+    """Check if the file is scheduled for addition."""
+
+    assert os.path.exists(target), "%s does not exist!" % target
+    entries = status(target, depth="empty")
+    return bool(len(entries["added"]) or len(entries["replaced"]))
+
+
 def add(pth):
     """Add a file."""
 
     assert os.path.exists(pth), "%s does not exist!" % pth
-    svnopen(['add', pth])
+    svnopen(['add', pth], get_cwd(pth), write=True)
 
 
 def cleanup(pth):
     """Clean up a folder."""
 
     assert os.path.exists(pth), "%s does not exist!" % pth
-    svnopen(['cleanup', pth])
+    svnopen(['cleanup', pth], get_cwd(pth), write=True)
 
 
 def status(pth, ignore_externals=False, ignore_unversioned=False, depth="infinity"):
@@ -290,7 +536,7 @@ def status(pth, ignore_externals=False, ignore_unversioned=False, depth="infinit
 
     args.append(pth)
 
-    output = svnopen(args)
+    output = svnopen(args, get_cwd(pth))
     root = ET.fromstring(output)
 
     target = root.find("target")
@@ -314,10 +560,31 @@ def status(pth, ignore_externals=False, ignore_unversioned=False, depth="infinit
     return attributes
 
 
+def get_changes(target):
+    """Get the modified, added, and conflicted files in the working copy the target belongs to (sorted)."""
+
+    root = get_wc_root(target)
+    if root is None:
+        return []
+    entries = status(root, ignore_externals=True, ignore_unversioned=True)
+    files = []
+    for item in ("added", "conflicted", "merged", "modified", "replaced"):
+        files += [os.path.normpath(os.path.join(root, path)) for path in entries[item]]
+    return sorted(set(f for f in files if os.path.isfile(f)))
+
+
 def is_versioned(target):
     """Check if file/folder is versioned."""
 
     assert os.path.exists(target), "%s does not exist!" % target
+    if get_wc_root(target) is None:
+        return False
+
+    if _wc_db_enabled():
+        try:
+            return get_node_state(target)[0]
+        except (WcDbError, OSError):
+            pass
 
     versioned = False
     try:
@@ -330,15 +597,39 @@ def is_versioned(target):
     return versioned
 
 
-def version():
-    """Get SVN app version."""
+def _probe(path):
+    """Get the version and capabilities of the SVN executable."""
 
     version = None
-    output = svnopen(['--version'])
+    output = runner.run([path, "--non-interactive", '--version'])
     m = re.search(br" version (\d+\.\d+\.\d+) ", output)
     if m is not None:
         version = m.group(1).decode('utf-8')
-    return version
+    info = tools.parse_version(version)
+    capabilities = set()
+    if info >= (1, 7):
+        capabilities.add("wc_db")
+    return version, capabilities
+
+
+def get_tool():
+    """Get the SVN tool info (cached)."""
+
+    return tools.get_tool(_svn_path, _probe)
+
+
+def has_capability(capability):
+    """Check if the SVN executable has the capability."""
+
+    tool = get_tool()
+    return tool is not None and capability in tool.capabilities
+
+
+def version():
+    """Get SVN app version."""
+
+    tool = get_tool()
+    return tool.version if tool is not None else None
 
 
 def set_svn_path(pth):
@@ -346,3 +637,10 @@ def set_svn_path(pth):
 
     global _svn_path
     _svn_path = pth
+
+
+def set_wc_db(enable):
+    """Enable or disable reading the working copy state from `wc.db`."""
+
+    global _use_wc_db
+    _use_wc_db = enable
@@ -0,0 +1,111 @@
+"""
+Version control tool discovery.
+
+Copyright (c) 2013 - 2015 Isaac Muse <isaacmuse@gmail.com>
+License: MIT
+"""
+from collections import namedtuple
+import os
+import re
+import threading
+import time
+
+# Seconds before looking again for a tool that wasn't found.
+MISSING_TTL = 60
+
+Tool = namedtuple("Tool", ["path", "version", "version_info", "capabilities"])
+
+_lock = threading.Lock()
+_locations = {}
+_tools = {}
+
+
+def parse_version(version):
+    """Parse a version string into a tuple of numbers (`(0,)` if it can't be parsed)."""
+
+    m = re.match(r"(\d+(?:\.\d+)*)", version or "")
+    return tuple(int(x) for x in m.group(1).split(".")) if m is not None else (0,)
+
+
+def _get_mtime(path):
+    """Get the modified time of the file (`None` if it doesn't exist)."""
+
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _search(executable):
+    """Search for the executable."""
+
+    location = None
+    if os.path.basename(executable) != executable:
+        if os.path.isfile(executable):
+            location = executable
+    else:
+        paths = [x for x in os.environ["PATH"].split(os.pathsep) if not x.isspace()]
+        for path in paths:
+            exe = os.path.join(path, executable)
+            if os.path.isfile(exe):
+                location = exe
+                break
+    return location
+
+
+def which(executable):
+    """
+    Find the executable.
+
+    Results are cached until `PATH` changes or the found file goes away.
+    Tools that weren't found are looked for again after `MISSING_TTL` seconds.
+    """
+
+    key = (executable, os.environ.get("PATH", ""))
+    with _lock:
+        entry = _locations.get(key)
+    if entry is not None:
+        location, found = entry
+        if location is not None and os.path.isfile(location):
+            return location
+        if location is None and time.time() - found < MISSING_TTL:
+            return None
+
+    location = _search(executable)
+    with _lock:
+        _locations[key] = (location, time.time())
+    return location
+
+
+def get_tool(executable, probe):
+    """
+    Get the tool's path, version, and capabilities.
+
+    `probe` is called with the tool's path and returns the version string and a set of capabilities.
+    The result is cached until the executable changes.
+    """
+
+    path = which(executable)
+    if path is None:
+        return None
+
+    key = (path, _get_mtime(path))
+    with _lock:
+        tool = _tools.get(key)
+    if tool is None:
+        try:
+            version, capabilities = probe(path)
+        except Exception:
+            version, capabilities = None, set()
+        tool = Tool(path, version, parse_version(version), frozenset(capabilities))
+        with _lock:
+            _tools[key] = tool
+    return tool
+
+
+def clear():
+    """Forget all discovered tools."""
+
+    with _lock:
+        _locations.clear()
+        _tools.clear()
@@ -0,0 +1,124 @@
+"""
+Version control root discovery.
+
+Copyright (c) 2013 - 2015 Isaac Muse <isaacmuse@gmail.com>
+License: MIT
+"""
+import os
+import threading
+
+GIT = "git"
+HG = "hg"
+SVN = "svn"
+
+MARKERS = {
+    GIT: ".git",
+    HG: ".hg",
+    SVN: ".svn"
+}
+
+# Drop the cache if it grows past this many folders.
+MAX_ENTRIES = 10000
+
+_lock = threading.Lock()
+_folders = {}
+_git_files = {}
+
+
+def _get_mtime(path):
+    """Get the modified time of a path (raises `OSError` if it doesn't exist)."""
+
+    st = os.stat(path)
+    return st.st_mtime_ns if hasattr(st, "st_mtime_ns") else st.st_mtime
+
+
+def _get_markers(folder):
+    """
+    Get the version control markers found in the folder.
+
+    Markers are cached per folder and rescanned when the folder's modified time changes
+    (creating or removing `.git`, `.hg`, or `.svn` changes the folder's modified time).
+    """
+
+    try:
+        mtime = _get_mtime(folder)
+    except OSError:
+        return {}
+
+    entry = _folders.get(folder)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+
+    markers = {}
+    for vc, name in MARKERS.items():
+        path = os.path.join(folder, name)
+        if os.path.isdir(path):
+            markers[vc] = True
+        elif os.path.isfile(path):
+            # Git worktrees and submodules use a `.git` file pointing at the Git directory.
+            markers[vc] = vc == GIT
+
+    with _lock:
+        if len(_folders) >= MAX_ENTRIES:
+            _folders.clear()
+        _folders[folder] = (mtime, markers)
+    return markers
+
+
+def find_root(target, vc):
+    """Find the closest folder at or above the target that is the root of the given version control."""
+
+    folder = os.path.dirname(target) if os.path.isfile(target) else target
+    folder = os.path.normpath(folder)
+    while True:
+        if _get_markers(folder).get(vc, False):
+            return folder
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            return None
+        folder = parent
+
+
+def get_git_dir(tree):
+    """Get the Git directory of the tree (following `.git` files used by worktrees and submodules)."""
+
+    path = os.path.join(tree, ".git")
+    try:
+        mtime = _get_mtime(path)
+    except OSError:
+        return path
+    if os.path.isdir(path):
+        return path
+
+    entry = _git_files.get(path)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+
+    git_dir = path
+    with open(path, "r") as f:
+        for line in f:
+            if line.startswith("gitdir:"):
+                git_dir = os.path.normpath(os.path.join(tree, line[7:].strip()))
+                break
+
+    with _lock:
+        _git_files[path] = (mtime, git_dir)
+    return git_dir
+
+
+def get_git_common_dir(git_dir):
+    """Get the Git directory holding the shared refs and objects (differs from the Git directory for worktrees)."""
+
+    path = os.path.join(git_dir, "commondir")
+    if os.path.isfile(path):
+        with open(path, "r") as f:
+            return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    return git_dir
+
+
+def clear():
+    """Clear the cache."""
+
+    with _lock:
+        _folders.clear()
+        _git_files.clear()
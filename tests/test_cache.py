@@ -0,0 +1,57 @@
+"""Test caches."""
+import unittest
+from lib.cache import LRUCache, HistoryCache
+
+
+class TestLRUCache(unittest.TestCase):
+    """Test the LRU cache."""
+
+    def test_evict_least_recently_used(self):
+        """Test that the least recently used entries are evicted once over the size cap."""
+
+        cache = LRUCache(10)
+        cache.put("a", 1, 4)
+        cache.put("b", 2, 4)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3, 4)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.size, 8)
+
+    def test_oversized_and_replaced(self):
+        """Test that entries bigger than the cap are not stored and replaced entries are sized again."""
+
+        cache = LRUCache(10)
+        cache.put("a", 1, 11)
+        self.assertIsNone(cache.get("a"))
+        cache.put("b", 1, 5)
+        cache.put("b", 2, 3)
+        self.assertEqual((cache.get("b"), cache.size), (2, 3))
+        cache.resize(2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.size, 0)
+
+
+class TestHistoryCache(unittest.TestCase):
+    """Test the paged history cache."""
+
+    def test_pages(self):
+        """Test that only missing records are fetched and short pages complete the history."""
+
+        history = list(range(7))
+        calls = []
+
+        def fetch(records, wanted):
+            """Fetch older records."""
+
+            calls.append((len(records), wanted))
+            return history[len(records):len(records) + wanted]
+
+        cache = HistoryCache(1000)
+        self.assertEqual(cache.get("f", 0, 3, fetch), [0, 1, 2])
+        self.assertEqual(cache.get("f", 0, 2, fetch), [0, 1])
+        self.assertEqual(cache.get("f", 3, 3, fetch), [3, 4, 5])
+        self.assertEqual(cache.get("f", 6, 3, fetch), [6])
+        self.assertEqual(cache.get("f", 7, 3, fetch), [])
+        self.assertEqual(calls, [(0, 3), (3, 3), (6, 3)])
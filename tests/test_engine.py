@@ -0,0 +1,103 @@
+"""Test diff engines."""
+import unittest
+import random
+from lib import engine
+
+
+class TestEngine(unittest.TestCase):
+    """Test the diff engines."""
+
+    def assert_valid(self, opcodes, a, b):
+        """Check that the opcodes cover both sequences and turn `a` into `b`."""
+
+        i = j = 0
+        result = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            self.assertEqual((i1, j1), (i, j))
+            if tag == 'equal':
+                self.assertEqual(list(a[i1:i2]), list(b[j1:j2]))
+            elif tag == 'delete':
+                self.assertEqual(j1, j2)
+            elif tag == 'insert':
+                self.assertEqual(i1, i2)
+            else:
+                self.assertEqual(tag, 'replace')
+            result.extend(b[j1:j2])
+            i, j = i2, j2
+        self.assertEqual((i, j), (len(a), len(b)))
+        self.assertEqual(result, list(b))
+
+    def changed_lines(self, opcodes):
+        """Count the lines that are not equal."""
+
+        return sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in opcodes if tag != 'equal')
+
+    def test_random_edits(self):
+        """Test that every engine gives valid opcodes for random edits."""
+
+        rand = random.Random(0)
+        for name in engine.ENGINES:
+            for _ in range(50):
+                a = [rand.choice('abcde') for _ in range(rand.randint(0, 60))]
+                b = list(a)
+                for _ in range(rand.randint(0, 8)):
+                    pos = rand.randint(0, len(b))
+                    if b and rand.random() < 0.5:
+                        del b[min(pos, len(b) - 1)]
+                    else:
+                        b.insert(pos, rand.choice('abcdef'))
+                self.assert_valid(engine.get_opcodes(a, b, name), a, b)
+
+    def test_repetitive_input(self):
+        """Test that regions without unique or rare lines still get a small diff."""
+
+        block = ['{', '    "k": 1,', '    "v": 2', '}']
+        a = block * 2000
+        b = list(a)
+        for x in range(40):
+            b[100 + x * 190] = '    "k": 3,'
+        for name in ('histogram', 'patience'):
+            opcodes = engine.get_opcodes(a, b, name)
+            self.assert_valid(opcodes, a, b)
+            self.assertEqual(self.changed_lines(opcodes), 40)
+
+    def test_myers_limit(self):
+        """Test that regions that differ too much are still valid."""
+
+        a = ['x', 'y'] * 2000
+        b = ['y', 'z'] * 2000
+        for name in ('histogram', 'patience'):
+            self.assert_valid(engine.get_opcodes(a, b, name), a, b)
+
+    def test_line_table(self):
+        """Test that interned lines compare like the text."""
+
+        table = engine.LineTable()
+        a = table.intern(['a', 'b', 'c'])
+        b = table.intern(['a', 'c', 'd'])
+        opcodes = engine.get_opcodes(a, b, 'histogram')
+        self.assert_valid(opcodes, a, b)
+        text = list(engine.unified_diff(a, b, 'a', 'b', lines=table.lines, opcodes=opcodes, lineterm=''))
+        self.assertEqual(text, ['--- a', '+++ b', '@@ -1,3 +1,3 @@', ' a', '-b', ' c', '+d'])
+
+    def test_update_opcodes(self):
+        """Test that updated opcodes match the edited sequences."""
+
+        rand = random.Random(1)
+        for name in engine.ENGINES:
+            for _ in range(100):
+                a = [rand.choice('abcd') for _ in range(rand.randint(1, 40))]
+                b = [rand.choice('abcd') for _ in range(rand.randint(1, 40))]
+                opcodes = engine.get_opcodes(a, b, name)
+                side = rand.randint(0, 1)
+                edited = list(a if side == 0 else b)
+                start = rand.randint(0, len(edited))
+                old_end = rand.randint(start, len(edited))
+                new = [rand.choice('abcde') for _ in range(rand.randint(0, 4))]
+                edited[start:old_end] = new
+                if side == 0:
+                    a = edited
+                else:
+                    b = edited
+                opcodes = engine.update_opcodes(opcodes, a, b, side, start, old_end, start + len(new), name)
+                self.assert_valid(opcodes, a, b)
@@ -0,0 +1,71 @@
+"""Test fast file compare."""
+import unittest
+import os
+import shutil
+import tempfile
+from lib import fastcmp
+
+
+class TestFastCmp(unittest.TestCase):
+    """Test comparing and inspecting files on disk."""
+
+    def setUp(self):
+        """Create a temp folder."""
+
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temp folder."""
+
+        shutil.rmtree(self.folder)
+
+    def write(self, name, data):
+        """Write a file and return its path."""
+
+        path = os.path.join(self.folder, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_detect_encoding(self):
+        """Test detecting the encoding from byte order marks and content."""
+
+        tests = (
+            ("café\n".encode("utf-8"), "utf_8"),
+            ("café\n".encode("utf-8-sig"), "utf_8_sig"),
+            ("café\n".encode("utf-16"), "utf_16"),
+            ("café\n".encode("utf-32"), "utf_32"),
+            ("café\n".encode("latin-1"), "cp1252"),
+            (b"", "utf_8")
+        )
+        for data, encoding in tests:
+            self.assertEqual(fastcmp.detect_encoding(self.write("a.txt", data)), encoding)
+
+    def test_default_encoding(self):
+        """Test that the default encoding is used when the content isn't UTF-8."""
+
+        path = self.write("a.txt", "ж\n".encode("cp1251"))
+        self.assertEqual(fastcmp.detect_encoding(path, "cp1251", "cp1252"), "cp1251")
+        self.assertEqual(fastcmp.detect_encoding(path, "utf_8", "cp1252"), "cp1252")
+
+    def test_compare_text(self):
+        """Test that differing text in other encodings is not taken for binary."""
+
+        tests = (
+            ("latin-1", "latin-1", "utf_8"),
+            ("utf-16", "utf-16", "utf_8"),
+            ("utf-32", "utf-32", "utf_8"),
+            ("utf-16-le", "utf-16-le", "utf_16_le")
+        )
+        for name, codec, encoding in tests:
+            a = self.write("a-%s.txt" % name, "café\nmenu\n".encode(codec))
+            b = self.write("b-%s.txt" % name, "café\nmenus\n".encode(codec))
+            self.assertEqual(fastcmp.compare_files(a, b, encoding, encoding), fastcmp.DIFFERENT, name)
+
+    def test_compare_binary(self):
+        """Test that files with NUL bytes are binary."""
+
+        a = self.write("a.bin", b"\x00\x01\x02")
+        b = self.write("b.bin", b"\x00\x01\x03")
+        self.assertEqual(fastcmp.compare_files(a, b), fastcmp.BINARY)
+        self.assertEqual(fastcmp.compare_files(a, a), fastcmp.IDENTICAL)
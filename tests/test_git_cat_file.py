@@ -0,0 +1,43 @@
+"""Test the Git `cat-file` server."""
+import unittest
+import os
+import shutil
+import tempfile
+from lib import git
+from .test_git_status import run_git, write
+
+
+@unittest.skipUnless(shutil.which("git"), "Git is not installed")
+class TestCatFile(unittest.TestCase):
+    """Test reading file content through `git cat-file --batch`."""
+
+    def setUp(self):
+        """Create a repository."""
+
+        self.tree = os.path.realpath(tempfile.mkdtemp())
+        run_git(self.tree, "init", "-q")
+        write(os.path.join(self.tree, "a b.txt"), "a\n")
+        run_git(self.tree, "add", "-A")
+        run_git(self.tree, "commit", "-q", "-m", "first")
+        git.set_read_objects(False)
+
+    def tearDown(self):
+        """Remove the repository."""
+
+        git.set_read_objects(True)
+        git.stop_cat_file_servers()
+        shutil.rmtree(self.tree)
+
+    def test_show(self):
+        """Test reading a committed file."""
+
+        self.assertEqual(git.show(os.path.join(self.tree, "a b.txt"), "HEAD"), b"a\n")
+
+    def test_missing_path_with_space(self):
+        """Test that a path with a space that isn't in the revision is reported as missing."""
+
+        target = os.path.join(self.tree, "new file.txt")
+        write(target, "new\n")
+        self.assertIsNone(git.show(target, "HEAD"))
+        # The server is still in sync after the missing object.
+        self.assertEqual(git.show(os.path.join(self.tree, "a b.txt"), "HEAD"), b"a\n")
@@ -0,0 +1,95 @@
+"""Test the Git status snapshot."""
+import unittest
+import os
+import shutil
+import subprocess
+import tempfile
+from lib import git
+from lib import runner
+
+
+def run_git(cwd, *args):
+    """Run Git in the folder."""
+
+    subprocess.check_output(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"] + list(args),
+        cwd=cwd, stderr=subprocess.STDOUT
+    )
+
+
+def write(path, text):
+    """Write a file."""
+
+    with open(path, "w") as f:
+        f.write(text)
+
+
+@unittest.skipUnless(shutil.which("git"), "Git is not installed")
+class TestStatusSnapshot(unittest.TestCase):
+    """Test the status snapshot."""
+
+    def setUp(self):
+        """Create a repository."""
+
+        self.tree = os.path.realpath(tempfile.mkdtemp())
+        run_git(self.tree, "init", "-q")
+        write(os.path.join(self.tree, ".gitignore"), "*.log\n")
+        write(os.path.join(self.tree, "a.txt"), "a\n")
+        write(os.path.join(self.tree, "b c.txt"), "b\n")
+        os.mkdir(os.path.join(self.tree, "sub"))
+        write(os.path.join(self.tree, "sub", "d.txt"), "d\n")
+        run_git(self.tree, "add", "-A")
+        run_git(self.tree, "commit", "-q", "-m", "first")
+        git._status_snapshots.clear()
+
+    def tearDown(self):
+        """Remove the repository."""
+
+        shutil.rmtree(self.tree)
+
+    def path(self, *parts):
+        """Get a path in the repository."""
+
+        return os.path.join(self.tree, *parts)
+
+    def status_runs(self):
+        """Count the `git status` calls so far."""
+
+        return runner.get_stats().get("git status", (0,))[0]
+
+    def test_states(self):
+        """Test that the states of all kinds of paths are parsed."""
+
+        write(self.path("b c.txt"), "changed\n")
+        write(self.path("new.txt"), "new\n")
+        write(self.path("x.log"), "log\n")
+        run_git(self.tree, "mv", "sub/d.txt", "sub/e.txt")
+
+        self.assertEqual(git.get_state(self.path("a.txt")), git.TRACKED)
+        self.assertEqual(git.get_state(self.path("b c.txt")), git.MODIFIED)
+        self.assertEqual(git.get_state(self.path("sub", "e.txt")), git.MODIFIED)
+        self.assertEqual(git.get_state(self.path("new.txt")), git.UNTRACKED)
+        self.assertEqual(git.get_state(self.path("x.log")), git.IGNORED)
+        self.assertTrue(git.is_versioned(self.path("sub")))
+
+    def test_touched_path_is_refreshed_once(self):
+        """Test that a file edited after the snapshot is only checked again when it changes."""
+
+        target = self.path("a.txt")
+        self.assertFalse(git.is_dirty(target))
+        write(target, "changed\n")
+        self.assertTrue(git.is_dirty(target))
+        runs = self.status_runs()
+        for _ in range(5):
+            self.assertTrue(git.is_dirty(target))
+        self.assertEqual(self.status_runs(), runs)
+
+        write(target, "a\n")
+        self.assertFalse(git.is_dirty(target))
+
+    def test_changes_include_work_tree_edits(self):
+        """Test that all changes are listed even if they were made after the snapshot."""
+
+        self.assertEqual(git.get_changes(self.path("a.txt")), [])
+        write(self.path("b c.txt"), "changed\n")
+        self.assertEqual(git.get_changes(self.path("a.txt")), [self.path("b c.txt")])
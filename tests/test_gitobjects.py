@@ -0,0 +1,90 @@
+"""Test the Git object reader."""
+import unittest
+import os
+import shutil
+import subprocess
+import tempfile
+from lib import gitobjects
+from .test_git_status import run_git, write
+
+
+def git_output(cwd, *args):
+    """Get the output of a Git command."""
+
+    return subprocess.check_output(["git"] + list(args), cwd=cwd)
+
+
+@unittest.skipUnless(shutil.which("git"), "Git is not installed")
+class TestObjectStore(unittest.TestCase):
+    """Test reading blobs from loose objects and packs."""
+
+    def setUp(self):
+        """Create a repository with a history of edits to the same files."""
+
+        self.tree = os.path.realpath(tempfile.mkdtemp())
+        run_git(self.tree, "init", "-q")
+        os.mkdir(os.path.join(self.tree, "sub"))
+        lines = ["line %d\n" % i for i in range(300)]
+        for n in range(12):
+            lines[n * 20] = "edit %d\n" % n
+            lines.append("added %d\n" % n)
+            write(os.path.join(self.tree, "a.txt"), "".join(lines))
+            write(os.path.join(self.tree, "sub", "b c.txt"), "".join(reversed(lines)))
+            run_git(self.tree, "add", "-A")
+            run_git(self.tree, "commit", "-q", "-m", "commit %d" % n)
+        self.commits = git_output(self.tree, "rev-list", "HEAD").decode("ascii").split()
+        gitobjects.clear()
+
+    def tearDown(self):
+        """Remove the repository."""
+
+        gitobjects.clear()
+        shutil.rmtree(self.tree)
+
+    def check_blobs(self):
+        """Check every file of every commit against `git show`."""
+
+        store = gitobjects.ObjectStore(os.path.join(self.tree, ".git"))
+        for commit in self.commits:
+            for path in ("a.txt", "sub/b c.txt"):
+                expected = git_output(self.tree, "show", "%s:%s" % (commit, path))
+                self.assertEqual(store.get_blob(commit, path), expected)
+            self.assertIsNone(store.get_blob(commit, "missing.txt"))
+            self.assertIsNone(store.get_blob(commit, "sub"))
+        return store
+
+    def test_loose(self):
+        """Test reading loose objects."""
+
+        self.check_blobs()
+
+    def test_packed(self):
+        """Test reading packed objects, including delta chains."""
+
+        run_git(self.tree, "gc", "-q", "--aggressive")
+        pack_dir = os.path.join(self.tree, ".git", "objects", "pack")
+        self.assertTrue(any(name.endswith(".pack") for name in os.listdir(pack_dir)))
+        verify = git_output(self.tree, "verify-pack", "-v", *[
+            os.path.join(pack_dir, name) for name in os.listdir(pack_dir) if name.endswith(".idx")
+        ])
+        # Make sure the test covers deltas.
+        self.assertIn(b"chain length", verify)
+        self.check_blobs()
+
+    def test_annotated_tag(self):
+        """Test that annotated tags are peeled to their commit."""
+
+        run_git(self.tree, "-c", "user.name=test", "-c", "user.email=test@example.com", "tag", "-a", "v1", "-m", "v1")
+        tag = git_output(self.tree, "rev-parse", "v1").decode("ascii").strip()
+        store = gitobjects.ObjectStore(os.path.join(self.tree, ".git"))
+        self.assertEqual(store.get_blob(tag, "a.txt"), git_output(self.tree, "show", "HEAD:a.txt"))
+
+    def test_apply_delta(self):
+        """Test copy and insert instructions."""
+
+        base = b"0123456789"
+        # Source size 10, target size 7, copy 4 bytes at offset 2, insert "xyz".
+        delta = bytes([10, 7, 0x80 | 0x01 | 0x10, 2, 4, 3]) + b"xyz"
+        self.assertEqual(gitobjects.apply_delta(base, delta), b"2345xyz")
+        with self.assertRaises(ValueError):
+            gitobjects.apply_delta(b"short", delta)
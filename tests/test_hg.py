@@ -0,0 +1,59 @@
+"""Test reading Mercurial state."""
+import unittest
+import binascii
+import os
+import shutil
+import tempfile
+from lib import hg
+from lib import vcroot
+
+
+class TestDirstate(unittest.TestCase):
+    """Test reading the working directory parent from the `dirstate`."""
+
+    def setUp(self):
+        """Create a repository folder."""
+
+        self.folder = os.path.realpath(tempfile.mkdtemp())
+        os.mkdir(os.path.join(self.folder, ".hg"))
+        self.target = os.path.join(self.folder, "file.txt")
+        with open(self.target, "w") as f:
+            f.write("text\\n")
+        self.p1 = bytes(range(1, 21))
+        self.p2 = b"\\x00" * 20
+        vcroot.clear()
+
+    def tearDown(self):
+        """Remove the repository folder."""
+
+        shutil.rmtree(self.folder)
+
+    def write_dirstate(self, data):
+        """Write the `dirstate`."""
+
+        with open(os.path.join(self.folder, ".hg", "dirstate"), "wb") as f:
+            f.write(data)
+
+    def test_v1(self):
+        """Test that the parent is read from the start of version 1 files."""
+
+        self.write_dirstate(self.p1 + self.p2 + b"n\\x00\\x00\\x01\\xa4")
+        self.assertEqual(hg.get_parent(self.target), binascii.hexlify(self.p1).decode("ascii"))
+
+    def test_v2(self):
+        """Test that the parent is read from version 2 dockets."""
+
+        padding = b"\\x00" * 12
+        self.write_dirstate(hg.DIRSTATE_V2_MARKER + self.p1 + padding + self.p2 + padding + b"\\x00" * 48)
+        self.assertEqual(hg.get_parent(self.target), binascii.hexlify(self.p1).decode("ascii"))
+
+    def test_unreadable(self):
+        """Test that a token still changes when the parent can't be read."""
+
+        self.write_dirstate(hg.DIRSTATE_V2_MARKER + b"\\x00")
+        token = hg.get_parent(self.target)
+        self.assertIsNotNone(token)
+        self.write_dirstate(hg.DIRSTATE_V2_MARKER + b"\\x00\\x00")
+        self.assertNotEqual(hg.get_parent(self.target), token)
+        os.remove(os.path.join(self.folder, ".hg", "dirstate"))
+        self.assertIsNone(hg.get_parent(self.target))
@@ -0,0 +1,35 @@
+"""Test the process runner."""
+import unittest
+import sys
+from lib import runner
+
+
+class TestRunner(unittest.TestCase):
+    """Test running version control processes."""
+
+    def test_run(self):
+        """Test that the output is returned and failures raise."""
+
+        self.assertEqual(runner.run([sys.executable, "-c", "print('ok')"]).strip(), b"ok")
+        with self.assertRaises(runner.ProcessError):
+            runner.run([sys.executable, "-c", "import sys; sys.exit(1)"])
+
+    def test_run_timeout(self):
+        """Test that commands that take too long are stopped."""
+
+        with self.assertRaises(runner.ProcessTimeout):
+            runner.run([sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.5)
+
+    def test_request_timeout(self):
+        """Test that a long running process that stops answering is killed."""
+
+        process = runner.popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        try:
+            with self.assertRaises(runner.ProcessTimeout):
+                with runner.request("sleep", process.kill, timeout=0.5):
+                    if not process.stdout.readline():
+                        raise IOError("Process closed")
+        finally:
+            process.kill()
+            process.communicate()
+        self.assertIn("sleep", runner.get_stats())
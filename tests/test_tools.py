@@ -0,0 +1,69 @@
+"""Test version control tool discovery."""
+import unittest
+import os
+import shutil
+import stat
+import tempfile
+from lib import tools
+
+
+class TestTools(unittest.TestCase):
+    """Test finding tools and probing them."""
+
+    def setUp(self):
+        """Create a folder with a fake tool."""
+
+        self.folder = os.path.realpath(tempfile.mkdtemp())
+        self.tool = os.path.join(self.folder, "fake-vc")
+        with open(self.tool, "w") as f:
+            f.write("#!/bin/sh\n")
+        os.chmod(self.tool, os.stat(self.tool).st_mode | stat.S_IEXEC)
+        tools.clear()
+
+    def tearDown(self):
+        """Remove the folder."""
+
+        tools.clear()
+        shutil.rmtree(self.folder)
+
+    def test_parse_version(self):
+        """Test parsing version strings."""
+
+        self.assertEqual(tools.parse_version("2.39.2.windows.1"), (2, 39, 2))
+        self.assertEqual(tools.parse_version("6.5"), (6, 5))
+        self.assertEqual(tools.parse_version(None), (0,))
+        self.assertEqual(tools.parse_version("unknown"), (0,))
+
+    def test_which(self):
+        """Test finding a tool by path and that removed tools are not reported."""
+
+        self.assertEqual(tools.which(self.tool), self.tool)
+        os.remove(self.tool)
+        self.assertIsNone(tools.which(self.tool))
+
+    def test_probe_is_cached(self):
+        """Test that a tool is probed once until it changes."""
+
+        calls = []
+
+        def probe(path):
+            """Report a version."""
+
+            calls.append(path)
+            return "1.2.3", {"fast"}
+
+        tool = tools.get_tool(self.tool, probe)
+        self.assertEqual((tool.version_info, tool.capabilities), ((1, 2, 3), frozenset({"fast"})))
+        tools.get_tool(self.tool, probe)
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_probe(self):
+        """Test that a tool whose probe fails has no capabilities."""
+
+        def probe(path):
+            """Fail."""
+
+            raise OSError("broken")
+
+        tool = tools.get_tool(self.tool, probe)
+        self.assertEqual((tool.version, tool.capabilities), (None, frozenset()))
@@ -0,0 +1,65 @@
+"""Test version control root discovery."""
+import unittest
+import os
+import shutil
+import tempfile
+from lib import vcroot
+from lib import hg
+from lib import svn
+from lib import runner
+
+
+class TestVcRoot(unittest.TestCase):
+    """Test finding version control roots."""
+
+    def setUp(self):
+        """Create folders."""
+
+        self.folder = os.path.realpath(tempfile.mkdtemp())
+        os.makedirs(os.path.join(self.folder, "repo", ".git"))
+        os.makedirs(os.path.join(self.folder, "repo", "sub", "deep"))
+        with open(os.path.join(self.folder, "repo", "sub", "file.txt"), "w") as f:
+            f.write("text\n")
+        vcroot.clear()
+
+    def tearDown(self):
+        """Remove folders."""
+
+        shutil.rmtree(self.folder)
+
+    def test_find_root(self):
+        """Test that the closest root is found for files and folders."""
+
+        repo = os.path.join(self.folder, "repo")
+        self.assertEqual(vcroot.find_root(os.path.join(repo, "sub", "file.txt"), vcroot.GIT), repo)
+        self.assertEqual(vcroot.find_root(os.path.join(repo, "sub", "deep"), vcroot.GIT), repo)
+        self.assertIsNone(vcroot.find_root(os.path.join(repo, "sub"), vcroot.HG))
+
+    def test_new_root_is_found(self):
+        """Test that a root created after a lookup is found."""
+
+        sub = os.path.join(self.folder, "repo", "sub")
+        self.assertIsNone(vcroot.find_root(sub, vcroot.SVN))
+        os.mkdir(os.path.join(sub, ".svn"))
+        self.assertEqual(vcroot.find_root(sub, vcroot.SVN), sub)
+
+    def test_git_file(self):
+        """Test that `.git` files of worktrees point to the Git directory."""
+
+        tree = os.path.join(self.folder, "worktree")
+        os.mkdir(tree)
+        with open(os.path.join(tree, ".git"), "w") as f:
+            f.write("gitdir: ../repo/.git/worktrees/wt\n")
+        self.assertEqual(vcroot.find_root(tree, vcroot.GIT), tree)
+        self.assertEqual(
+            vcroot.get_git_dir(tree), os.path.join(self.folder, "repo", ".git", "worktrees", "wt")
+        )
+
+    def test_not_versioned_without_root(self):
+        """Test that files outside Mercurial and SVN roots are checked without running the tools."""
+
+        target = os.path.join(self.folder, "repo", "sub", "file.txt")
+        stats = runner.get_stats()
+        self.assertFalse(hg.is_versioned(target))
+        self.assertFalse(svn.is_versioned(target))
+        self.assertEqual(runner.get_stats(), stats)